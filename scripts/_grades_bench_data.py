@@ -0,0 +1,103 @@
+"""
+Synthetic github_events_log_v3 rows shared by the grades benchmarks
+(bench-grades-pipeline.py, bench-grades-compression.py, bench-grades-cold-start.py).
+
+N students x H homeworks x K attempts in the real "Points X/Y"
+check_run_summary format: ~15% of attempts late (up to 4 days past the
+deadline), ~2% from a bot sender, ~1% in a repo of no known homework. The
+sequence is fixed by the seed, so every run sees the same input.
+"""
+
+import datetime
+import json
+import random
+
+ATTEMPTS = 5
+BOT_SENDER = "github-classroom[bot]"
+
+
+class Row:
+    """An events row, or any other row the benchmarks' fake pools hand out."""
+
+    __slots__ = ("sender", "repo_name", "completed_at_str", "check_run_summary", "event_time",
+                 "homework", "student_login", "points", "max_points", "completed_at",
+                 "github_nick", "fio", "department", "exam_sum", "name", "changed_at",
+                 "fingerprint", "watermark", "best_submissions")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+
+class ResultSet:
+    def __init__(self, rows):
+        self.rows = rows
+
+
+def load_known_homeworks(meta_path):
+    """hw-meta.json as {id: {"deadline", "max_points"}}.
+
+    Doesn't use homeworks.py, so it also reads the hw-meta.json of an older
+    tree (bench-grades-cold-start.py --baseline).
+    """
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    return {
+        item["id"]: {
+            "deadline": datetime.datetime.strptime(item["deadline"], "%Y-%m-%dT%H:%M:%S"),
+            "max_points": item.get("max_points") or 100,
+        }
+        for item in meta
+    }
+
+
+def synthetic_events(known_homeworks, students, attempts=ATTEMPTS, parse_check_run=None, seed=0, part_rows=1000):
+    """Yield result set parts of events rows, deterministically.
+
+    parse_check_run(repo_name, summary, completed_at_str) fills in the columns
+    the webhook parses at ingestion; without it they stay NULL, as on rows
+    written before that.
+    """
+    rnd = random.Random(seed)
+    part = []
+    for hw_id, meta in known_homeworks.items():
+        max_points = meta["max_points"] or 100
+        deadline = meta["deadline"]
+        for s in range(students):
+            login = f"student{s}"
+            repo_name = f"fintech-dl-hse-{hw_id}-{login}"
+            for _ in range(attempts):
+                offset_hours = rnd.randint(-240, 0) if rnd.random() > 0.15 else rnd.randint(1, 96)
+                completed_at = deadline + datetime.timedelta(hours=offset_hours, seconds=rnd.randint(0, 3599))
+                roll = rnd.random()
+                if roll < 0.02:
+                    sender, repo = BOT_SENDER, repo_name
+                elif roll < 0.03:
+                    sender, repo = login, f"fintech-dl-hse-sandbox-{login}"
+                else:
+                    sender, repo = login, repo_name
+                completed_at_str = completed_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+                summary = f"Points {rnd.randint(0, max_points)}/{max_points}"
+                parsed = parse_check_run(repo, summary, completed_at_str) if parse_check_run else {}
+                part.append(Row(
+                    sender=sender,
+                    repo_name=repo,
+                    completed_at_str=completed_at_str,
+                    check_run_summary=summary,
+                    event_time=datetime.datetime(completed_at.year, completed_at.month, completed_at.day),
+                    **parsed,
+                ))
+                if len(part) >= part_rows:
+                    yield ResultSet(part)
+                    part = []
+    if part:
+        yield ResultSet(part)
+
+
+def synthetic_rows(known_homeworks, students, attempts=ATTEMPTS, parse_check_run=None):
+    """synthetic_events as one list of rows."""
+    return [
+        row
+        for part in synthetic_events(known_homeworks, students, attempts, parse_check_run)
+        for row in part.rows
+    ]
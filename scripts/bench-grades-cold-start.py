@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark of the grades function: import + first summary page.
+
+Imports index.py in a fresh interpreter, the way a new function instance
+would, and runs handler_summary once against an in-memory stand-in for the
+YDB session pool. Reports import time (of index.py and what it pulls in,
+except the ydb package both paths need), handler time, HTML size and peak RSS
+as one JSON line per path:
+
+  stdlib    the current function (terraform/functions/grades);
+  baseline  with --baseline REV, the function as of git revision REV, e.g. the
+            pandas/numpy implementation before the pandas-free path:
+
+    python3 scripts/bench-grades-cold-start.py --students 300 --attempts 5 --baseline 459b25b
+
+The stand-in serves every event to both paths, ignoring the LIMIT 10000 of the
+old events query. Needs the ydb package (and pandas/numpy for the baseline);
+never connects anywhere. Run from the checkhw repo root.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _grades_bench_data import ResultSet, Row, load_known_homeworks, synthetic_rows
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GRADES_DIR = REPO_ROOT / "terraform" / "functions" / "grades"
+
+
+class _StubPool:
+    """Answers both the current and the old queries: events, FIOs, nothing else."""
+
+    def __init__(self):
+        self.rows = []
+
+    def execute_with_retries(self, query, parameters=None, *args, **kwargs):
+        if 'FROM github_events_log' in query:
+            return [ResultSet(self.rows[i:i + 1000]) for i in range(0, len(self.rows), 1000)]
+        if 'FROM github_nick_to_fio' in query:
+            nicks = set()
+            for value in (parameters or {}).values():
+                value = value[0] if isinstance(value, tuple) else value
+                nicks.update(value if isinstance(value, list) else [value])
+            return [ResultSet([
+                Row(github_nick=nick, fio=f"Студент {nick[7:]}", department="ЭАД") for nick in sorted(nicks)
+            ])]
+        if 'FROM grades_versions' in query:
+            return [ResultSet([Row(name="github_events_log_v3", changed_at=datetime.datetime(2026, 1, 1))])]
+        return [ResultSet([])]
+
+    def retry_operation_sync(self, callee, *args, **kwargs):
+        return callee(self)
+
+    def execute(self, query, parameters=None, *args, **kwargs):
+        return contextlib.nullcontext(self.execute_with_retries(query, parameters))
+
+
+def run_child(function_dir, students, attempts):
+    """Body of the child process: import and run one path from a clean interpreter."""
+    import ydb
+    import ydb.iam
+
+    stub = _StubPool()
+    # The old index.py connects at import time.
+    ydb.Driver = lambda *args, **kwargs: type("Driver", (), {"wait": lambda self, **kw: None})()
+    ydb.QuerySessionPool = lambda *args, **kwargs: stub
+    ydb.iam.MetadataUrlCredentials = lambda *args, **kwargs: None
+
+    sys.path.insert(0, str(function_dir))
+    started = time.perf_counter()
+    import index
+    import_s = time.perf_counter() - started
+
+    index.pool = stub
+    stub.rows = synthetic_rows(load_known_homeworks(Path(function_dir) / "hw-meta.json"), students, attempts)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = index.handler_summary({"queryStringParameters": {}, "headers": {}}, None)
+    run_s = time.perf_counter() - started
+
+    print(json.dumps({
+        "events": len(stub.rows),
+        "import_s": round(import_s, 4),
+        "run_s": round(run_s, 4),
+        "html_bytes": len(response["body"].encode("utf-8")),
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def _run(path, function_dir, args):
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", str(function_dir),
+         "--students", str(args.students), "--attempts", str(args.attempts)],
+        capture_output=True, text=True, check=True,
+    )
+    print(json.dumps({"path": path, **json.loads(result.stdout.strip().splitlines()[-1])}))
+
+
+def _export(revision, target):
+    """Write the grades function as of `revision` to `target`."""
+    for name in ("index.py", "hw-meta.json"):
+        source = subprocess.run(
+            ["git", "show", f"{revision}:terraform/functions/grades/{name}"],
+            cwd=REPO_ROOT, capture_output=True, check=True,
+        ).stdout
+        (Path(target) / name).write_bytes(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--attempts", type=int, default=5)
+    parser.add_argument("--baseline", metavar="REV", help="also run the grades function as of this git revision")
+    parser.add_argument("--child", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.students, args.attempts)
+        return
+
+    _run("stdlib", GRADES_DIR, args)
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as baseline_dir:
+            _export(args.baseline, baseline_dir)
+            _run("baseline", baseline_dir, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Bytes over the wire and render + compress latency of the grades pages.
+
+Renders the summary and detailed pages (HTML and ?format=json) from synthetic
+submissions and compresses each body the way index._compress_response does:
+
+  identity  plain body;
+  gzip      gzip.compress at index.GZIP_LEVEL;
+  br        brotli at index.BROTLI_QUALITY (skipped if brotli isn't installed).
+
+"wire_bytes" counts the base64 the function gateway carries for compressed
+bodies. No YDB access. Run from the checkhw repo root:
+
+    python3 scripts/bench-grades-compression.py --students 300 --attempts 5
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+GRADES_DIR = Path(__file__).resolve().parent.parent / "terraform" / "functions" / "grades"
+sys.path.insert(0, str(GRADES_DIR))
+
+import grading  # noqa: E402
+import homeworks  # noqa: E402
+from _grades_bench_data import synthetic_rows  # noqa: E402
+
+# Kept in sync with index.GZIP_LEVEL / index.BROTLI_QUALITY (index isn't
+# imported: it needs the ydb package).
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _encoders():
+    encoders = [
+        ("identity", None),
+        ("gzip", lambda raw: gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)),
+    ]
+    try:
+        import brotli
+        encoders.append(("br", lambda raw: brotli.compress(raw, quality=BROTLI_QUALITY)))
+    except ImportError:
+        print("brotli not installed, skipping br", file=sys.stderr)
+    return encoders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--attempts", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="best-of-N timings")
+    args = parser.parse_args()
+
+    known_homeworks = homeworks.load_known_homeworks()
+    homework_index = homeworks.HomeworkIndex(known_homeworks.keys())
+    best_submissions = {}
+    rows = synthetic_rows(known_homeworks, args.students, args.attempts)
+    for submission in grading.parse_events(rows, known_homeworks, homework_index, {}):
+        grading.merge_best_submission(best_submissions, submission)
+    result_rows = grading.apply_bonuses(best_submissions, [], known_homeworks)
+    summary = grading.build_summary(result_rows, {}, {}, {}, known_homeworks, {})
+
+    pages = {
+        "summary.html": lambda: grading.render_summary_page(summary, result_rows, known_homeworks, {}),
+        "summary.json": lambda: json.dumps(
+            grading.summary_data(summary, result_rows, known_homeworks, {}), ensure_ascii=False, separators=(',', ':')),
+        "detailed.html": lambda: grading.render_detailed_page(result_rows),
+        "detailed.json": lambda: json.dumps(
+            grading.detailed_data(result_rows), ensure_ascii=False, separators=(',', ':')),
+    }
+
+    for page, render in pages.items():
+        for encoding, compress in _encoders():
+            best_render = best_compress = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                raw = render().encode("utf-8")
+                rendered = time.perf_counter()
+                body = raw if compress is None else base64.b64encode(compress(raw))
+                done = time.perf_counter()
+                best_render = min(best_render, rendered - started)
+                best_compress = min(best_compress, done - rendered)
+            print(json.dumps({
+                "page": page,
+                "encoding": encoding,
+                "body_bytes": len(raw),
+                "wire_bytes": len(body),
+                "render_ms": round(best_render * 1000, 1),
+                "compress_ms": round(best_compress * 1000, 1),
+            }))
+
+
+if __name__ == "__main__":
+    main()
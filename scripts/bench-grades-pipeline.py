@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the grades function (index._handler) on synthetic events.
+
+Generates github_events_log_v3 rows for N students x H homeworks x K attempts
+(_grades_bench_data.py: late submissions, bot senders and repos of no known
+homework), with the columns the webhook parses at ingestion filled in
+(--raw-rows leaves them NULL, as on rows written before that), and serves them
+to _handler from an in-memory fake of the YDB session pool. Each (events, view) pair runs in a fresh
+interpreter and prints one JSON line:
+
+  events, view        input size and summary/detailed;
+  stages              wall seconds of ydb (fake pool calls, minus the work
+                      nested inside them), parse, aggregate (merging into best
+                      submissions), apply_bonuses, build_summary, render,
+                      compress and total;
+  peak_rss_mb         peak RSS of the child process;
+  peak_traced_mb      tracemalloc peak of the run, only with --trace-memory
+                      (tracing slows allocations down several times, so the
+                      stage timings of such a run aren't comparable);
+  body_bytes          size of the response body as sent (gzip + base64).
+
+Rows are generated on the fly from a fixed seed, so the input (and body_bytes)
+is identical between runs and never held in memory at once; generating them
+is timed separately and excluded from "ydb" and "total". Save a run as a
+baseline and compare later runs against it to catch regressions:
+
+    python3 scripts/bench-grades-pipeline.py --events 1000 10000 100000 > base.jsonl
+    python3 scripts/bench-grades-pipeline.py --events 1000 10000 100000 --compare base.jsonl
+
+Needs the ydb package (index imports it); never connects anywhere.
+"""
+
+import argparse
+import contextlib
+import datetime
+import functools
+import io
+import json
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from _grades_bench_data import ATTEMPTS, ResultSet, Row, synthetic_events
+
+GRADES_DIR = Path(__file__).resolve().parent.parent / "terraform" / "functions" / "grades"
+
+
+def _students_for(events, homework_count):
+    return max(1, round(events / (homework_count * ATTEMPTS)))
+
+
+class FakePool:
+    """The subset of ydb.QuerySessionPool _handler uses, backed by generated data."""
+
+    def __init__(self, index, homeworks, known_homeworks, students, raw_rows, timer):
+        self._index = index
+        self._homeworks = homeworks
+        self._known_homeworks = known_homeworks
+        self._students = students
+        self._raw_rows = raw_rows
+        self._timer = timer
+        self._snapshot = None
+
+    def _answer(self, query, params):
+        index = self._index
+        if query in (index.STUDENTS_INFO_QUERY, index.STUDENTS_FIO_QUERY):
+            nicks = params['$github_nicks'][0]
+            rows = [
+                Row(github_nick=nick, fio=f"Студент {nick[7:]}", department="ЭАД")
+                for nick in nicks if int(nick[7:]) % 5  # every 5th student has no FIO
+            ]
+            return [ResultSet(rows)]
+        if 'FROM exam_grades' in query:
+            rows = [Row(fio=f"студент {s}", exam_sum=float(s % 3)) for s in range(0, self._students, 2)]
+            return [ResultSet(rows)]
+        if 'FROM grades_versions' in query:
+            return [ResultSet([Row(name="github_events_log_v3", changed_at=datetime.datetime(2026, 1, 1))])]
+        if 'UPSERT INTO grades_snapshot' in query:
+            self._snapshot = params
+            return [ResultSet([])]
+        if 'FROM grades_snapshot' in query:
+            return [ResultSet([])]
+        raise NotImplementedError(query)
+
+    def execute_with_retries(self, query, params=None, *args, **kwargs):
+        with self._timer.stage("ydb"):
+            return self._answer(query, params)
+
+    def retry_operation_sync(self, callee, *args, **kwargs):
+        return callee(_FakeSession(self))
+
+
+class _FakeSession:
+    def __init__(self, pool):
+        self._pool = pool
+
+    @contextlib.contextmanager
+    def execute(self, query, params=None, *args, **kwargs):
+        if query != self._pool._index.EVENTS_QUERY:
+            raise NotImplementedError(query)
+        pool = self._pool
+        timer = pool._timer
+        homeworks = pool._homeworks
+        parse_check_run = None if pool._raw_rows else functools.partial(
+            homeworks.parse_check_run, homeworks.HomeworkIndex(pool._known_homeworks.keys()))
+        parts = synthetic_events(pool._known_homeworks, pool._students, parse_check_run=parse_check_run)
+
+        def timed_parts():
+            while True:
+                with timer.stage("generate"):
+                    part = next(parts, None)
+                if part is None:
+                    return
+                yield part
+
+        yield timed_parts()
+
+
+class StageTimer:
+    """Exclusive wall time per stage: nested stages are subtracted from their parent.
+
+    _handler reads students info and exam grades on worker threads, so stacks
+    are per thread and those reads add to "ydb" while the main thread works.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self._local.__dict__.setdefault("stack", [])
+        started = time.perf_counter()
+        stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = stack.pop()
+            with self._lock:
+                self.seconds[name] = self.seconds.get(name, 0.0) + elapsed - nested
+            if stack:
+                stack[-1] += elapsed
+
+    def wrap(self, module, name, stage):
+        original = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            with self.stage(stage):
+                return original(*args, **kwargs)
+
+        setattr(module, name, timed)
+
+
+def run_child(events, view, raw_rows, trace_memory):
+    sys.path.insert(0, str(GRADES_DIR))
+    import grading
+    import homeworks
+    import index
+
+    known_homeworks = homeworks.load_known_homeworks()
+    students = _students_for(events, len(known_homeworks))
+    timer = StageTimer()
+    index.pool = FakePool(index, homeworks, known_homeworks, students, raw_rows, timer)
+
+    timer.wrap(grading, "parse_events", "parse")
+    timer.wrap(grading, "merge_best_submission", "aggregate")
+    timer.wrap(grading, "apply_bonuses", "apply_bonuses")
+    timer.wrap(grading, "build_summary", "build_summary")
+    timer.wrap(grading, "render_summary_page", "render")
+    timer.wrap(grading, "render_detailed_page", "render")
+    timer.wrap(index, "_compress_response", "compress")
+
+    event = {'queryStringParameters': {}, 'headers': {'Accept-Encoding': 'gzip'}}
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = index._handler(event, None, detailed=(view == "detailed"))
+    total = time.perf_counter() - started
+
+    generate = timer.seconds.pop("generate", 0.0)
+    stages = {name: round(seconds, 4) for name, seconds in sorted(timer.seconds.items())}
+    stages["total"] = round(total - generate, 4)
+    result = {
+        "events": students * len(known_homeworks) * ATTEMPTS,
+        "view": view,
+        "raw_rows": raw_rows,
+        "stages": stages,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "body_bytes": len(response["body"].encode("utf-8")),
+    }
+    if trace_memory:
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    """Print regressions of total time / peak memory / body size against a baseline run."""
+    baseline = {}
+    with open(baseline_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                baseline[(row["events"], row["view"], row.get("raw_rows", False))] = row
+    regressions = []
+    for row in results:
+        base = baseline.get((row["events"], row["view"], row["raw_rows"]))
+        if base is None:
+            continue
+        checks = [
+            ("total_s", row["stages"]["total"], base["stages"]["total"]),
+            ("peak_rss_mb", row["peak_rss_mb"], base["peak_rss_mb"]),
+            ("body_bytes", row["body_bytes"], base["body_bytes"]),
+        ]
+        if "peak_traced_mb" in row and "peak_traced_mb" in base:
+            checks.append(("peak_traced_mb", row["peak_traced_mb"], base["peak_traced_mb"]))
+        for metric, value, base_value in checks:
+            if base_value and value > base_value * (1 + tolerance):
+                regressions.append(f"{row['events']} {row['view']} {metric}: {base_value} -> {value}")
+    for regression in regressions:
+        print("REGRESSION", regression, file=sys.stderr)
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--views", nargs="+", choices=["summary", "detailed"], default=["summary", "detailed"])
+    parser.add_argument("--compare", metavar="BASELINE_JSONL", help="fail on regressions against a saved run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth for --compare")
+    parser.add_argument("--raw-rows", action="store_true", help="rows without the ingestion-parsed columns")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak (slow)")
+    parser.add_argument("--child", nargs=2, metavar=("EVENTS", "VIEW"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(int(args.child[0]), args.child[1], args.raw_rows, args.trace_memory)))
+        return
+
+    results = []
+    for events in args.events:
+        for view in args.views:
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", str(events), view]
+                + (["--raw-rows"] if args.raw_rows else [])
+                + (["--trace-memory"] if args.trace_memory else []),
+                capture_output=True, text=True, check=True,
+            )
+            line = result.stdout.strip().splitlines()[-1]
+            print(line, flush=True)
+            results.append(json.loads(line))
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,13 @@ Bump user_hash (version) for all homeworks-info-* yandex_function resources
 in terraform/main.tf so that Terraform redeploys the grades function when
 index.py or hw-meta.json changes.
 
+With --hook, also bump handle-github-hook-tf: the Makefile packs
+hw-meta.json, homeworks.py and ydb_pool.py into the webhook's zip too.
+
 Run from the checkhw repo root.
 """
 
+import argparse
 import re
 import sys
 from pathlib import Path
@@ -18,46 +22,70 @@ def repo_root():
 
 def update_homeworks_info_versions(main_tf_path: Path) -> bool:
     """
-    Find user_hash in homeworks-info-* resource blocks (v0.0.N), increment N,
-    and write the new version to all three blocks.
+    Find user_hash in every homeworks-info-* resource block (v0.0.N) and set
+    them all to the highest N plus one, so a block added at another version
+    joins the shared one on the next bump.
     Returns True if main.tf was modified.
     """
     content = main_tf_path.read_text(encoding="utf-8")
 
-    # Find first homeworks-info block and get current version
-    block_match = re.search(
-        r'resource\s+"yandex_function"\s+"homeworks-info-[^"]+"\s*\{.*?'
-        r'user_hash\s*=\s*"v0\.0\.(\d+)"',
-        content,
+    # user_hash of each homeworks-info block; the name match keeps other
+    # resources (the webhook, compute) out of it
+    pattern = re.compile(
+        r'(resource\s+"yandex_function"\s+"homeworks-info-[^"]+"\s*\{[^}]*?'
+        r'user_hash\s*=\s*"v0\.0\.)(\d+)(")',
         re.DOTALL,
     )
-    if not block_match:
+    versions = [int(m.group(2)) for m in pattern.finditer(content)]
+    if not versions:
         return False
 
-    current = int(block_match.group(1))
+    current = max(versions)
     new_version = current + 1
+    new_content, n = pattern.subn(r'\g<1>' + str(new_version) + r'\g<3>', content)
+
+    main_tf_path.write_text(new_content, encoding="utf-8")
+    print(f"Bumped homeworks-info-* user_hash from v0.0.{current} to v0.0.{new_version} ({n} resources)")
+    return True
+
+
+def update_function_version(main_tf_path: Path, name: str) -> bool:
+    """
+    Increment user_hash (v0.0.N) of the yandex_function resource `name`.
+    Returns True if main.tf was modified.
+    """
+    content = main_tf_path.read_text(encoding="utf-8")
 
-    # Replace only the version number in user_hash lines that match v0.0.<current>
-    # (all three homeworks-info blocks use the same version)
     pattern = re.compile(
-        r'(user_hash\s*=\s*"v0\.0\.)' + str(current) + r'(")',
+        r'(resource\s+"yandex_function"\s+"' + re.escape(name) + r'"\s*\{[^}]*?'
+        r'user_hash\s*=\s*"v0\.0\.)(\d+)(")',
+        re.DOTALL,
     )
-    new_content, n = pattern.subn(r'\g<1>' + str(new_version) + r'\g<2>', content, count=3)
-    if n == 0:
+    match = pattern.search(content)
+    if not match:
         return False
 
+    current = int(match.group(2))
+    new_content = pattern.sub(r'\g<1>' + str(current + 1) + r'\g<3>', content, count=1)
+
     main_tf_path.write_text(new_content, encoding="utf-8")
-    print(f"Bumped homeworks-info-* user_hash from v0.0.{current} to v0.0.{new_version} ({n} resources)")
+    print(f"Bumped {name} user_hash from v0.0.{current} to v0.0.{current + 1}")
     return True
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hook", action="store_true", help="also bump handle-github-hook-tf")
+    args = parser.parse_args()
+
     root = repo_root()
     main_tf_path = root / "terraform" / "main.tf"
     if not main_tf_path.is_file():
         print(f"Not found: {main_tf_path}", file=sys.stderr)
         sys.exit(1)
     update_homeworks_info_versions(main_tf_path)
+    if args.hook:
+        update_function_version(main_tf_path, "handle-github-hook-tf")
 
 
 if __name__ == "__main__":
@@ -1,28 +1,52 @@
 import os
 import ydb
-import ydb.iam
 
+import datetime
+import gzip
 import hashlib
 import hmac
 
 import json
 
-# Create driver in global space.
-driver = ydb.Driver(
-  endpoint=os.getenv('YDB_ENDPOINT'),
-  database=os.getenv('YDB_DATABASE'),
-  credentials=ydb.iam.MetadataUrlCredentials(),
-)
+# Packed next to this file from functions/grades by the Makefile.
+import homeworks
+import ydb_pool
 
 hithub_webhook_secret_token = os.getenv('HITHUB_WEBHOOK_SECRET_TOKEN')
 
+known_homeworks = homeworks.load_known_homeworks()
+homework_index = homeworks.load_homework_index(known_homeworks)
 
-# Wait for the driver to become active for requests.
+# Created lazily on the first query and reused across warm invocations.
+pool = ydb_pool.LazyPool()
 
-driver.wait(fail_fast=True, timeout=5)
 
-# Create the session pool instance to manage YDB sessions.
-pool = ydb.QuerySessionPool(driver)
+def ignored(reason):
+    print(f"dropped event: {reason}")
+    return {
+        'statusCode': 200,
+        'body': f'ignored: {reason}',
+    }
+
+
+def drop_event(reason):
+    """Acknowledge an event without writing it, counted in webhook_dropped_events."""
+    try:
+        pool.execute_with_retries(COUNT_DROPPED_EVENT, {'$reason': reason})
+    except Exception as e:
+        # A lost count mustn't make GitHub redeliver the event.
+        print(f"cant count dropped event error: {e}")
+    return ignored(reason)
+
+
+def _header(event, name):
+    """Case-insensitive request header lookup: the gateway canonicalizes
+    names, so GitHub's X-GitHub-Delivery arrives as X-Github-Delivery."""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
 
 
 def verify_signature(payload_body, secret_token, signature_header):
@@ -46,53 +70,160 @@ def verify_signature(payload_body, secret_token, signature_header):
 
     return True
 
-def execute_query(pool, event_data, sender, repo, check_run_summary, completed_at):
-    # Create the transaction and execute query.
-
-    placeholders = {
-        '$event_data':        event_data,
-        '$sender':            sender,
-        '$repo':              repo,
-        '$check_run_summary': check_run_summary,
-        '$completed_at':      completed_at,
-    }
-    print("placeholders", placeholders)
-
-    return pool.execute_with_retries(
-        '''
+# Declarations of execute_query's parameters, shared by its statements.
+EVENT_DECLARES = '''
+        DECLARE $check_run_id as Uint64;
+        DECLARE $action as UTF8;
+        DECLARE $delivery_id as Optional<UTF8>;
         DECLARE $sender as UTF8;
         DECLARE $repo as UTF8;
         DECLARE $check_run_summary as UTF8;
         DECLARE $completed_at as UTF8;
-        DECLARE $event_data as UTF8;
+        DECLARE $payload as String;
+        DECLARE $homework as Optional<UTF8>;
+        DECLARE $student_login as Optional<UTF8>;
+        DECLARE $points as Optional<Int32>;
+        DECLARE $max_points as Optional<Int32>;
+        DECLARE $completed_at_ts as Optional<Timestamp>;
+'''
+
+# The penalized score of the event, folded into best_submissions (ydb/005) if
+# it beats the stored one. Reads the table, so it goes before the writes.
+FOLD_BEST_SUBMISSION = '''
+        DECLARE $term as Uint32;
+        DECLARE $penalty_days as Int32;
+        DECLARE $result_points as Double;
+
+        UPSERT INTO best_submissions
+            (term, student_login, homework, max_points, penalty_days, result_points, completed_at, updated_at)
+        SELECT
+            c.term AS term,
+            c.student_login AS student_login,
+            c.homework AS homework,
+            c.max_points AS max_points,
+            c.penalty_days AS penalty_days,
+            c.result_points AS result_points,
+            c.completed_at AS completed_at,
+            CurrentUtcTimestamp() AS updated_at
+        FROM (
+            SELECT
+                $term AS term,
+                Unwrap($student_login) AS student_login,
+                Unwrap($homework) AS homework,
+                $max_points AS max_points,
+                $penalty_days AS penalty_days,
+                $result_points AS result_points,
+                $completed_at_ts AS completed_at
+        ) AS c
+        LEFT JOIN best_submissions AS b
+            ON b.term = c.term AND b.student_login = c.student_login AND b.homework = c.homework
+        WHERE b.homework IS NULL
+            OR c.result_points > b.result_points
+            OR (c.result_points = b.result_points AND c.completed_at > b.completed_at);
+'''
 
-        INSERT INTO github_events_log_v2
+# One more event of the day dropped for $reason (webhook_dropped_events,
+# ydb/007). Reads the table before writing it.
+COUNT_DROPPED_EVENT = '''
+        DECLARE $reason as UTF8;
+
+        $day = CurrentUtcDate();
+
+        UPSERT INTO webhook_dropped_events (day, reason, dropped)
+        SELECT $day AS day, $reason AS reason, COALESCE(MAX(dropped), 0ul) + 1ul AS dropped
+        FROM webhook_dropped_events
+        WHERE day = $day AND reason = $reason;
+'''
+
+# Keyed on (check_run_id, action): a redelivery of the same event overwrites
+# its row instead of adding a duplicate. The narrow row goes to the log the
+# grades function scans, the raw body gzipped to the cold
+# github_event_payloads table (ydb/004).
+WRITE_EVENT = '''
+        UPSERT INTO github_events_log_v3
             (
-                event_data,
+                check_run_id,
+                action,
+                delivery_id,
                 event_time,
                 sender,
                 repo_name,
                 check_run_summary,
-                completed_at_str
+                completed_at_str,
+                homework,
+                student_login,
+                points,
+                max_points,
+                completed_at
             )
         VALUES
             (
-                $event_data,
+                $check_run_id,
+                $action,
+                $delivery_id,
                 CurrentUtcDate(),
                 $sender,
                 $repo,
                 $check_run_summary,
-                $completed_at
+                $completed_at,
+                $homework,
+                $student_login,
+                $points,
+                $max_points,
+                $completed_at_ts
             );
-        ''',
-        placeholders
-    )
+
+        UPSERT INTO github_event_payloads (check_run_id, action, delivery_id, encoding, payload, received_at)
+        VALUES ($check_run_id, $action, $delivery_id, "gzip", $payload, CurrentUtcTimestamp());
+
+        UPSERT INTO grades_versions (name, changed_at)
+        VALUES ("github_events_log_v3", CurrentUtcTimestamp());
+'''
+
+LOG_EVENT_QUERY = EVENT_DECLARES + FOLD_BEST_SUBMISSION + WRITE_EVENT
+LOG_UNKNOWN_REPO_EVENT_QUERY = EVENT_DECLARES + COUNT_DROPPED_EVENT + WRITE_EVENT
+
+
+def execute_query(pool, check_run_id, action, delivery_id, event_data, sender, repo, check_run_summary, completed_at, parsed, best):
+    # Create the transaction and execute query.
+
+    # parsed: homeworks.parse_check_run of the event, stored as typed columns
+    # so the grades function doesn't re-parse the strings on every read.
+    # best: term, penalty_days and result_points of the event, folded into
+    # best_submissions; None for an unknown_repo event, which is written with
+    # NULL typed columns and counted as dropped instead.
+    placeholders = {
+        '$check_run_id':      (check_run_id, ydb.PrimitiveType.Uint64),
+        '$action':            action,
+        '$delivery_id':       (delivery_id, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        '$payload':           (gzip.compress(event_data.encode('utf-8'), mtime=0), ydb.PrimitiveType.String),
+        '$sender':            sender,
+        '$repo':              repo,
+        '$check_run_summary': check_run_summary,
+        '$completed_at':      completed_at,
+        '$homework':          (parsed['homework'], ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        '$student_login':     (parsed['student_login'], ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        '$points':            (parsed['points'], ydb.OptionalType(ydb.PrimitiveType.Int32)),
+        '$max_points':        (parsed['max_points'], ydb.OptionalType(ydb.PrimitiveType.Int32)),
+        '$completed_at_ts':   (parsed['completed_at'], ydb.OptionalType(ydb.PrimitiveType.Timestamp)),
+    }
+    if best is None:
+        query = LOG_UNKNOWN_REPO_EVENT_QUERY
+        placeholders['$reason'] = 'unknown_repo'
+    else:
+        query = LOG_EVENT_QUERY
+        placeholders['$term'] = (best['term'], ydb.PrimitiveType.Uint32)
+        placeholders['$penalty_days'] = (best['penalty_days'], ydb.PrimitiveType.Int32)
+        placeholders['$result_points'] = (best['result_points'], ydb.PrimitiveType.Double)
+    print("placeholders", {name: value for name, value in placeholders.items() if name != '$payload'})
+
+    return pool.execute_with_retries(query, placeholders)
 
 def handler(event, context):
     print("event", event)
 
     event_body = event['body'].encode('utf-8')
-    if not verify_signature(event_body, hithub_webhook_secret_token, event['headers']['X-Hub-Signature-256']):
+    if not verify_signature(event_body, hithub_webhook_secret_token, _header(event, 'X-Hub-Signature-256')):
         print("Bad signature")
         return {
             'statusCode': 404,
@@ -103,18 +234,75 @@ def handler(event, context):
 
     json_line = json.loads(event_body)
 
+    # Only completed check runs carry the points; created/rerequested events
+    # (and non-check_run events such as ping) are acknowledged and dropped.
+    action = json_line.get('action')
+    check_run = json_line.get('check_run')
+    if not check_run or check_run.get('id') is None:
+        return drop_event('not_check_run')
+    if action != 'completed':
+        return drop_event('not_completed')
+
     # Execute query with the retry_operation helper.
     run_summary = json_line['check_run']['output']['summary']
     if run_summary is None:
         run_summary = ""
 
+    parsed = homeworks.parse_check_run(
+        homework_index,
+        json_line["repository"]["name"],
+        run_summary,
+        json_line['check_run']['completed_at'],
+    )
+    print("parsed", parsed)
+
+    # Bots and runs without points would only be skipped by every grades read;
+    # they aren't written at all. A repo of no homework in the packed
+    # hw-meta.json is logged uncounted (see homeworks.drop_reason).
+    reason = homeworks.drop_reason(json_line["sender"]["login"], parsed)
+    if reason == 'unknown_repo':
+        execute_query(
+            pool,
+            int(check_run['id']),
+            action,
+            _header(event, 'X-GitHub-Delivery'),
+            event['body'],
+            json_line["sender"]["login"],
+            json_line["repository"]["name"],
+            run_summary,
+            json_line['check_run']['completed_at'],
+            parsed,
+            None,
+        )
+        return ignored(reason)
+    if reason is not None:
+        return drop_event(reason)
+
+    repo_name = json_line["repository"]["name"]
+    penalty_days = homeworks.penalty_days(
+        parsed['completed_at'],
+        known_homeworks[parsed['homework']]['deadline'],
+        homeworks.FORCED_PENALTY_DAYS.get(repo_name.removeprefix(homeworks.REPO_PREFIX)),
+    )
+    best = {
+        # The grades function's term: the UTC year the event arrived in.
+        'term': datetime.datetime.utcnow().year,
+        'penalty_days': int(penalty_days),
+        'result_points': homeworks.penalized_points(parsed['points'], penalty_days),
+    }
+
     result = execute_query(
         pool,
+        int(check_run['id']),
+        action,
+        _header(event, 'X-GitHub-Delivery'),
         event['body'],
         json_line["sender"]["login"],
         json_line["repository"]["name"],
         run_summary,
-        json_line['check_run']['completed_at']
+        json_line['check_run']['completed_at'],
+        parsed,
+        best,
     )
 
     return {
@@ -0,0 +1,911 @@
+"""I/O-free part of the grades function: events -> best submissions -> grades -> HTML.
+
+Everything here runs on the standard library, so a cold start of the grades
+function doesn't pay for importing pandas/numpy.
+"""
+import array
+import datetime
+import html
+import json
+import math
+import sys
+
+import homeworks
+
+# Max raw exam points; 'Сумма баллов за экзамены' is scaled by this to the 0-2 exam grade.
+EXAM_MAX = 2
+
+DEPARTMENTS = ['-', 'ФТиАД', 'ЭАД', 'ФЭН', 'ИПИИ']
+
+# check_run_summary looks like "Points 80/100"; the webhook parses it with the same regex.
+POINTS_RE = homeworks.POINTS_RE
+
+
+def normalize_fio(value):
+    """Canonical FIO form, shared verbatim with the bot's ingestion side.
+
+    Steps (order matters): drop '<'/'>'/'"' -> lowercase -> e-yo fold ->
+    collapse whitespace. Word order is preserved, so matching is order-sensitive.
+    """
+    if not value:
+        return ""
+    s = str(value)
+    s = s.replace("<", "").replace(">", "").replace('"', "")
+    s = s.lower().replace("ё", "е")  # ё -> е
+    s = " ".join(s.split())
+    return s
+
+
+def merge_best_submission(best_submissions, submission):
+    """Keep the best submission per (sender, homework) in place.
+
+    Highest result_points wins; ties prefer the latest submission. The merge is
+    idempotent, so feeding the same event twice is harmless.
+    Returns True if the submission replaced the stored one.
+    """
+    if isinstance(best_submissions, SubmissionTable):
+        return best_submissions.merge(submission)
+    key = (submission["sender"], submission["homework"])
+    current = best_submissions.get(key)
+    if current is None or (submission["result_points"], submission["completed_at"]) > (current["result_points"], current["completed_at"]):
+        best_submissions[key] = submission
+        return True
+    return False
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class SubmissionTable:
+    """Best submissions per (sender, homework), stored column-wise.
+
+    A dict of per-submission dicts costs ~350 bytes a submission; here sender and
+    homework are categorical codes and the other fields live in typed arrays:
+
+      sender, homework  uint32 / uint16 codes into per-table category lists;
+      max_points        uint16;
+      result_points     float64 (penalized points are fractional);
+      penalty_days      int8 (penalty_percent is always penalty_days * 10);
+      completed_at      int64 microseconds since the epoch (naive UTC).
+
+    Quacks like the {(sender, homework): submission dict} mapping the rest of
+    the module works with; rows are materialized as dicts only on read.
+    """
+
+    def __init__(self, submissions=()):
+        self._senders = []
+        self._sender_codes = {}
+        self._homeworks = []
+        self._homework_codes = {}
+        # (sender code << 16 | homework code) -> row number
+        self._rows = {}
+        self._sender = array.array('I')
+        self._homework = array.array('H')
+        self._max_points = array.array('H')
+        self._result_points = array.array('d')
+        self._penalty_days = array.array('b')
+        self._completed_at = array.array('q')
+        for submission in submissions:
+            self.merge(submission)
+
+    def _code(self, values, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _row_key(self, sender, homework, create):
+        if create:
+            sender_code = self._code(self._senders, self._sender_codes, sender)
+            homework_code = self._code(self._homeworks, self._homework_codes, homework)
+        else:
+            sender_code = self._sender_codes.get(sender)
+            homework_code = self._homework_codes.get(homework)
+            if sender_code is None or homework_code is None:
+                return None
+        return sender_code << 16 | homework_code
+
+    def _put(self, submission, replace_if_better):
+        row_key = self._row_key(submission["sender"], submission["homework"], create=True)
+        completed_at = (submission["completed_at"] - _EPOCH) // _MICROSECOND
+        i = self._rows.get(row_key)
+        if i is None:
+            self._rows[row_key] = len(self._sender)
+            self._sender.append(row_key >> 16)
+            self._homework.append(row_key & 0xFFFF)
+            self._max_points.append(submission["max_points"])
+            self._result_points.append(submission["result_points"])
+            self._penalty_days.append(int(submission["penalty_days"]))
+            self._completed_at.append(completed_at)
+            return True
+        if replace_if_better and (submission["result_points"], completed_at) <= (self._result_points[i], self._completed_at[i]):
+            return False
+        self._max_points[i] = submission["max_points"]
+        self._result_points[i] = submission["result_points"]
+        self._penalty_days[i] = int(submission["penalty_days"])
+        self._completed_at[i] = completed_at
+        return True
+
+    def merge(self, submission):
+        """merge_best_submission on the columns, without building a dict."""
+        return self._put(submission, replace_if_better=True)
+
+    def _row(self, i):
+        penalty_days = float(self._penalty_days[i])
+        return {
+            "sender": self._senders[self._sender[i]],
+            "max_points": self._max_points[i],
+            "result_points": self._result_points[i],
+            "homework": self._homeworks[self._homework[i]],
+            "penalty_days": penalty_days,
+            "penalty_percent": penalty_days * 10,
+            "completed_at": _EPOCH + self._completed_at[i] * _MICROSECOND,
+        }
+
+    def get(self, key, default=None):
+        row_key = self._row_key(key[0], key[1], create=False)
+        i = self._rows.get(row_key) if row_key is not None else None
+        return default if i is None else self._row(i)
+
+    def __getitem__(self, key):
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __setitem__(self, key, submission):
+        if key != (submission["sender"], submission["homework"]):
+            raise ValueError(f"key {key} doesn't match the submission")
+        self._put(submission, replace_if_better=False)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._sender)
+
+    def keys(self):
+        return [(self._senders[s], self._homeworks[h]) for s, h in zip(self._sender, self._homework)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def values(self):
+        return [self._row(i) for i in range(len(self))]
+
+    def items(self):
+        return [((row["sender"], row["homework"]), row) for row in self.values()]
+
+    def copy(self):
+        table = SubmissionTable()
+        table._senders = list(self._senders)
+        table._sender_codes = dict(self._sender_codes)
+        table._homeworks = list(self._homeworks)
+        table._homework_codes = dict(self._homework_codes)
+        table._rows = dict(self._rows)
+        for name in ('_sender', '_homework', '_max_points', '_result_points', '_penalty_days', '_completed_at'):
+            setattr(table, name, array.array(getattr(self, name).typecode, getattr(self, name)))
+        return table
+
+    def clear(self):
+        self.__init__()
+
+    def update(self, other):
+        for submission in other.values():
+            self.merge(submission)
+
+    def nbytes(self):
+        """Approximate memory held by the table: columns, row index and categories."""
+        columns = sum(
+            column.itemsize * len(column)
+            for column in (self._sender, self._homework, self._max_points,
+                           self._result_points, self._penalty_days, self._completed_at)
+        )
+        row_index = sys.getsizeof(self._rows) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._rows.items())
+        categories = sum(
+            sys.getsizeof(values) + sys.getsizeof(codes) + sum(sys.getsizeof(v) for v in values)
+            for values, codes in ((self._senders, self._sender_codes), (self._homeworks, self._homework_codes))
+        )
+        return columns + row_index + categories
+
+
+def parse_events(rows, known_homeworks, homework_index, forced_penalty_days):
+    """Turn github_events_log_v3 rows into their best submissions.
+
+    Rows that don't count (no points summary, bot senders, repos that match no
+    known homework) are dropped. homework, student_login, points, max_points
+    and completed_at, parsed at ingestion, are taken as is; where they are
+    NULL (a repo of no homework known then) the raw strings are parsed. Repo names and summaries repeat
+    a lot, so each distinct value is parsed once and cached for the rest of the
+    rows. Returns a list of submission dicts, at most one per (sender, homework).
+    """
+    # repo_name -> (sender, homework, deadline, forced penalty days or None),
+    # or None for repos that match no homework.
+    repos = {}
+    # check_run_summary -> (points, max_points), or None if unparsable.
+    summaries = {}
+    best = {}
+    for row in rows:
+        if row.sender.endswith(homeworks.BOT_SENDER_SUFFIX):
+            continue
+
+        homework = row.homework
+        if homework is not None and row.points is not None and row.completed_at is not None:
+            meta = known_homeworks.get(homework)
+            if meta is None:
+                continue
+            student_login = row.student_login
+            points = (row.points, row.max_points)
+            completed_at = row.completed_at
+            deadline = meta['deadline']
+            forced_penalty = forced_penalty_days.get(row.repo_name.removeprefix('fintech-dl-hse-')) if forced_penalty_days else None
+        else:
+            parsed = _parse_raw_event(row, known_homeworks, homework_index, forced_penalty_days, repos, summaries)
+            if parsed is None:
+                continue
+            student_login, homework, deadline, forced_penalty, points, completed_at = parsed
+
+        penalty_days = homeworks.penalty_days(completed_at, deadline, forced_penalty)
+        penalty_percent = penalty_days * 10
+
+        merge_best_submission(best, {
+            "sender": student_login,
+            "max_points": points[1],
+            "result_points": homeworks.penalized_points(points[0], penalty_days),
+            "homework": homework,
+            "penalty_days": penalty_days,
+            "penalty_percent": penalty_percent,
+            "completed_at": completed_at,
+        })
+    return list(best.values())
+
+
+def _parse_raw_event(row, known_homeworks, homework_index, forced_penalty_days, repos, summaries):
+    """parse_events for a row without the parsed columns, from its raw strings.
+
+    Returns (student_login, homework, deadline, forced penalty days or None,
+    (points, max_points), completed_at), or None if the row doesn't count.
+    repos and summaries are the caller's caches, see parse_events.
+    """
+    summary = row.check_run_summary
+    if not summary:
+        return None
+
+    points = summaries.get(summary, False)
+    if points is False:
+        match = POINTS_RE.match(summary)
+        points = summaries[summary] = (int(match.group(1)), int(match.group(2))) if match else None
+    if points is None:
+        return None
+
+    repo_name = row.repo_name
+    repo = repos.get(repo_name, False)
+    if repo is False:
+        resolved = homework_index.resolve(repo_name)
+        if resolved is None:
+            repo = None
+        else:
+            homework, student_login = resolved
+            repo = (
+                student_login,
+                homework,
+                known_homeworks[homework]['deadline'],
+                forced_penalty_days.get(repo_name.removeprefix('fintech-dl-hse-')),
+            )
+        repos[repo_name] = repo
+    if repo is None:
+        return None
+
+    completed_at = datetime.datetime.fromisoformat(row.completed_at_str[:19])
+    return repo + (points, completed_at)
+
+
+
+def apply_bonuses(best_submissions, bonuses, known_homeworks):
+    """Best submissions ordered by (sender, homework), with bonus points added.
+
+    Bonus points go on top of the student's best submission for the homework
+    and may exceed its max_points; a bonus without a submission becomes a row
+    of its own, appended at the end.
+    """
+    result_rows = [dict(best_submissions[key]) for key in sorted(best_submissions)]
+    by_key = {(row["sender"], row["homework"]): row for row in result_rows}
+    for bonus in bonuses:
+        row = by_key.get((bonus["sender"], bonus["homework"]))
+        if row is not None:
+            row["result_points"] = row["result_points"] + bonus["bonus_points"]
+        else:
+            result_rows.append({
+                "sender": bonus["sender"],
+                "max_points": known_homeworks.get(bonus["homework"], {}).get("max_points", 0),
+                "result_points": float(bonus["bonus_points"]),
+                "homework": bonus["homework"],
+                "penalty_days": 0.0,
+                "penalty_percent": 0.0,
+                "completed_at": datetime.datetime.utcnow(),
+            })
+    return result_rows
+
+
+def _has_fio(fio):
+    return fio is not None and str(fio).strip() != ''
+
+
+def exam_grade(exam_sum):
+    """Raw exam points -> the 0-2 exam part of the final grade."""
+    return min((exam_sum or 0.0) / EXAM_MAX, 1.0) * 2.0
+
+
+def final_grade(sender, hw_hse_grade_rounded, exam_hse_grade, forced_final_grades):
+    """The exam grade plus the ROUNDED homework grade, capped at 10; hardcoded
+    overrides by github nick win."""
+    if sender in forced_final_grades:
+        return forced_final_grades[sender]
+    return min(hw_hse_grade_rounded + exam_hse_grade, 10.0)
+
+
+def build_summary(result_rows, fio_by_sender, dept_by_sender, exam_sum_by_fio, known_homeworks, forced_final_grades):
+    """Per-student grades from the best submissions.
+
+    Returns a dict with:
+      students           - one row per sender (ordered by sender) with the
+                           columns of the summary table;
+      fio_collisions     - (sender, normalized fio) pairs whose exam row was
+                           already taken by another student;
+      orphan_exam_fios   - exam rows that matched no student;
+      no_fio_with_grade  - senders with a final grade >= 4 but no FIO;
+      export_data        - rows for the client-side CSV download.
+    """
+    total_points = {}
+    for row in result_rows:
+        total_points.setdefault(row["sender"], []).append(row["result_points"])
+
+    hw_max_points = sum(
+        meta["max_points"] for meta in known_homeworks.values()
+        if not meta.get("bonus", False)
+    )
+
+    students = []
+    for sender in sorted(total_points):
+        result_points = math.fsum(total_points[sender])
+        hw_hse_grade = f"{min(result_points / max(hw_max_points, 1), 1.0) * 8.0:.2f}"
+        students.append({
+            "sender": sender,
+            "result_points": result_points,
+            "fio": fio_by_sender.get(sender),
+            "department": dept_by_sender.get(sender),
+            "hw_hse_grade": hw_hse_grade,
+            "hw_hse_grade_rounded": int(float(hw_hse_grade) + 0.5),
+        })
+
+    # Exam grades: exact normalized-FIO match, each exam row used by at most one
+    # student. Collisions (same normalized FIO) and orphan exam rows are reported.
+    used_exam_fios = set()
+    fio_collisions = []
+    exam_sum_by_sender = {}
+    for student in students:
+        key = normalize_fio(student["fio"])
+        if not key or key not in exam_sum_by_fio:
+            continue
+        if key in used_exam_fios:
+            fio_collisions.append((student["sender"], key))
+            continue
+        used_exam_fios.add(key)
+        exam_sum_by_sender[student["sender"]] = exam_sum_by_fio[key]
+    orphan_exam_fios = sorted(f for f in exam_sum_by_fio if f not in used_exam_fios)
+
+    no_fio_with_grade = []
+    export_data = []
+    for student in students:
+        sender = student["sender"]
+        exam_hse_grade = exam_grade(exam_sum_by_sender.get(sender, 0.0))
+        student["exam_hse_grade"] = f"{exam_hse_grade:.2f}"
+        final_hse_grade = final_grade(sender, student["hw_hse_grade_rounded"], exam_hse_grade, forced_final_grades)
+        student["final_hse_grade"] = f"{final_hse_grade:.2f}"
+
+        # github nicks with a final grade >= 4 but no FIO filled in - surfaced at
+        # the bottom of the page so admins can chase them.
+        if not _has_fio(student["fio"]):
+            if final_hse_grade >= 4 and sender:
+                no_fio_with_grade.append(sender)
+            continue
+        # Data for the client-side "download CSV" button: only students with a FIO.
+        export_data.append({
+            'nick': sender,
+            'fio': str(student["fio"]),
+            'dept': student["department"] or '-',
+            'hw': str(student["hw_hse_grade_rounded"]),
+            'exam': student["exam_hse_grade"],
+            'final': student["final_hse_grade"],
+        })
+
+    return {
+        "students": students,
+        "fio_collisions": fio_collisions,
+        "orphan_exam_fios": orphan_exam_fios,
+        "no_fio_with_grade": sorted(no_fio_with_grade),
+        "export_data": export_data,
+    }
+
+
+SUMMARY_COLUMNS = [
+    'sender', 'result_points', 'fio', 'department',
+    'hw_hse_grade', 'hw_hse_grade_rounded', 'exam_hse_grade', 'final_hse_grade',
+]
+
+DETAILED_COLUMNS = [
+    'sender', 'max_points', 'result_points', 'homework',
+    'penalty_days', 'penalty_percent', 'completed_at',
+]
+
+
+def _format_cell(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return html.escape(str(value), quote=False)
+
+
+def _attr(value):
+    return html.escape(str(value), quote=True)
+
+
+def _js_arg(value):
+    """A JS string literal for an inline handler attribute, e.g. onclick="f('nick')"."""
+    literal = "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+    return html.escape(literal, quote=False).replace('"', '&quot;')
+
+
+def iter_table(columns, rows, index=True, cell_renderers=None):
+    """Yield a DataFrame.to_html()-shaped table (one cell per line) chunk by chunk.
+
+    cell_renderers maps a column name to fn(row) -> '<td>...</td>' for cells
+    that need markup of their own; every other cell is escaped by _format_cell.
+    One chunk per row, no trailing newline.
+    """
+    cell_renderers = cell_renderers or {}
+    header = ['<table border="1" class="dataframe">', '  <thead>', '    <tr style="text-align: right;">']
+    if index:
+        header.append('      <th></th>')
+    header.extend(f'      <th>{column}</th>' for column in columns)
+    header.extend(['    </tr>', '  </thead>', '  <tbody>'])
+    yield '\n'.join(header)
+    for i, row in enumerate(rows):
+        lines = ['\n    <tr>']
+        if index:
+            lines.append(f'      <th>{i}</th>')
+        for column in columns:
+            render_cell = cell_renderers.get(column)
+            if render_cell is not None:
+                lines.append('      ' + render_cell(row))
+            else:
+                lines.append(f'      <td>{_format_cell(row[column])}</td>')
+        lines.append('    </tr>')
+        yield '\n'.join(lines)
+    yield '\n  </tbody>\n</table>'
+
+
+def render_table(columns, rows, index=True, cell_renderers=None):
+    return ''.join(iter_table(columns, rows, index, cell_renderers))
+
+
+JS_CODE = """
+        <script>
+        const SAVE_USER_INFO_URL = 'https://functions.yandexcloud.net/d4e6tbb4ljr32is5gi0g';
+
+        function saveUserInfo(github_nick, field, value) {
+            // The current homework grade lets the endpoint return the final
+            // grade recomputed against the (possibly newly matched) exam.
+            const hwCell = document.getElementById('hw_rounded_' + github_nick);
+            let url = `${SAVE_USER_INFO_URL}?github_nick=${encodeURIComponent(github_nick)}&${field}=${encodeURIComponent(value)}`;
+            if (hwCell) url += `&hw_hse_grade_rounded=${encodeURIComponent(hwCell.textContent)}`;
+
+            fetch(url)
+                .then(response => {
+                    if (!response.ok) {
+                        alert(field === 'fio' ? 'Failed to update FIO' : 'Failed to update department');
+                        return;
+                    }
+                    return response.json().then(applySavedRow);
+                })
+                .catch(error => {
+                    alert('Error: ' + error);
+                });
+        }
+
+        // Patch the saved student's row in place instead of reloading the page.
+        function applySavedRow(row) {
+            const nick = row.github_nick;
+            const input = document.getElementById('fio_' + nick);
+            const text = document.getElementById('fio_text_' + nick);
+            const editButton = document.getElementById('fio_edit_' + nick);
+            if (input) {
+                input.value = row.fio;
+                input.dataset.original = row.fio;
+                if (text) {
+                    text.textContent = row.fio;
+                    text.style.display = '';
+                    if (editButton) editButton.style.display = '';
+                    input.style.display = 'none';
+                }
+            }
+            const select = document.getElementById('dept_' + nick);
+            if (select) {
+                select.value = row.department;
+                select.dataset.original = row.department;
+            }
+            for (const id of ['fio_save_' + nick, 'dept_save_' + nick]) {
+                const button = document.getElementById(id);
+                if (button) button.style.display = 'none';
+            }
+            for (const field of ['exam_hse_grade', 'final_hse_grade']) {
+                const cell = document.getElementById(field.replace('_hse_grade', '_') + nick);
+                if (cell && row[field] !== undefined) cell.textContent = row[field];
+            }
+            // Keep the CSV export (students with a FIO only) in step.
+            if (typeof GRADES_EXPORT !== 'undefined') {
+                const index = GRADES_EXPORT.findIndex(r => r.nick === nick);
+                if (row.fio.trim() === '') {
+                    if (index >= 0) GRADES_EXPORT.splice(index, 1);
+                } else {
+                    const cellText = id => {
+                        const cell = document.getElementById(id + nick);
+                        return cell ? cell.textContent : '';
+                    };
+                    const entry = {
+                        nick: nick,
+                        fio: row.fio,
+                        dept: row.department,
+                        hw: cellText('hw_rounded_'),
+                        exam: cellText('exam_'),
+                        final: cellText('final_'),
+                    };
+                    if (index >= 0) GRADES_EXPORT[index] = entry;
+                    else GRADES_EXPORT.push(entry);
+                }
+            }
+        }
+
+        function updateFio(github_nick, inputId='') {
+            const fioValue = inputId ?
+                document.getElementById(inputId).value :
+                document.getElementById('fio_' + github_nick).value;
+            saveUserInfo(github_nick, 'fio', fioValue);
+        }
+
+        function editFio(github_nick) {
+            const text = document.getElementById('fio_text_' + github_nick);
+            const editButton = document.getElementById('fio_edit_' + github_nick);
+            if (text) text.style.display = 'none';
+            if (editButton) editButton.style.display = 'none';
+            document.getElementById('fio_' + github_nick).style.display = '';
+        }
+
+        function onFioChange(github_nick) {
+            const input = document.getElementById('fio_' + github_nick);
+            const button = document.getElementById('fio_save_' + github_nick);
+            button.style.display = (input.value !== input.dataset.original) ? '' : 'none';
+        }
+
+        function onDepartmentChange(github_nick) {
+            const select = document.getElementById('dept_' + github_nick);
+            const button = document.getElementById('dept_save_' + github_nick);
+            button.style.display = (select.value !== select.dataset.original) ? '' : 'none';
+        }
+
+        function updateDepartment(github_nick) {
+            const department = document.getElementById('dept_' + github_nick).value;
+            saveUserInfo(github_nick, 'department', department);
+        }
+        </script>
+        """
+
+STYLE_CSS = """
+        <style>
+            input::placeholder {
+                font-weight: bold;
+                opacity: 0.3;
+                color: red;
+            }
+
+            table.dataframe {
+                border-collapse: collapse;
+                font-family: Arial, sans-serif;
+                font-size: 14px;
+            }
+
+            table.dataframe thead {
+                background-color: #f2f2f2;
+            }
+
+            table.dataframe th,
+            table.dataframe td {
+                border: 1px solid #ccc;
+                padding: 8px 12px;
+                text-align: left;
+            }
+
+            table.dataframe tr:nth-child(even) {
+                background-color: #fafafa;
+            }
+
+            table.dataframe tr:hover {
+                background-color: #f1f1f1;
+            }
+
+            input[type="text"] {
+                padding: 5px;
+                font-size: 14px;
+                width: 90%;
+                box-sizing: border-box;
+            }
+
+            button {
+                padding: 5px 10px;
+                font-size: 14px;
+                cursor: pointer;
+                background-color: #007bff;
+                border: none;
+                color: white;
+                border-radius: 4px;
+            }
+
+            button:hover {
+                background-color: #0056b3;
+            }
+        </style>
+        """
+
+
+def _homework_stats(result_rows, known_homeworks, hw_to_max_points):
+    rows_by_homework = {}
+    for row in result_rows:
+        rows_by_homework.setdefault(row["homework"], []).append(row)
+    stats_data = []
+    for hw_name in known_homeworks.keys():
+        hw_rows = rows_by_homework.get(hw_name, [])
+        if hw_rows:
+            non_zero_count = sum(1 for row in hw_rows if row["result_points"] > 0)
+            full_score_count = sum(1 for row in hw_rows if row["result_points"] == row["max_points"])
+            avg_score = sum(row["result_points"] for row in hw_rows) / len(hw_rows)
+            max_points = hw_rows[0]["max_points"]
+        else:
+            non_zero_count = 0
+            full_score_count = 0
+            avg_score = 0.0
+            max_points = hw_to_max_points.get(hw_name, 0) if hw_to_max_points else 0
+
+        stats_data.append({
+            'homework': hw_name,
+            'students_with_points': non_zero_count,
+            'students_with_full_score': full_score_count,
+            'avg_score': f"{avg_score:.2f}" if avg_score > 0 else "0.00",
+            'max_points': max_points,
+        })
+    return stats_data
+
+
+def _fio_cell(student):
+    """FIO editable in place; a fill-in input where it is still missing."""
+    sender = student["sender"]
+    fio = student["fio"]
+    if not sender:
+        return f'<td>{_format_cell(fio)}</td>'
+    nick = _attr(sender)
+    nick_arg = _js_arg(sender)
+    save_button = (
+        f'<button id="fio_save_{nick}" onclick="updateFio({nick_arg})" '
+        f'style="display:none;">Save</button></td>'
+    )
+    if fio is None:
+        return (
+            f'<td><input placeholder="FILL FIO HERE!" type="text" '
+            f'id="fio_{nick}" data-original="" '
+            f'oninput="onFioChange({nick_arg})" style="width: 200px;"> '
+            + save_button
+        )
+    value = _attr(fio)
+    return (
+        f'<td><span id="fio_text_{nick}">{_format_cell(fio)}</span> '
+        f'<button id="fio_edit_{nick}" onclick="editFio({nick_arg})" '
+        f'title="Edit FIO" style="background:none;border:none;padding:0 4px;'
+        f'cursor:pointer;filter:grayscale(1);opacity:0.45;font-size:14px;">✏️</button> '
+        f'<input type="text" id="fio_{nick}" value="{value}" '
+        f'data-original="{value}" oninput="onFioChange({nick_arg})" '
+        f'style="width: 200px; display:none;"> '
+        + save_button
+    )
+
+
+# <option> lists differ only in which one is selected: prerender one per value.
+_DEPARTMENT_OPTIONS = {
+    current: ''.join(
+        f'<option value="{_attr(option)}"{" selected" if option == current else ""}>{_format_cell(option)}</option>'
+        for option in DEPARTMENTS
+    )
+    for current in DEPARTMENTS
+}
+
+
+def _department_cell(student):
+    """Department <select> + Save button."""
+    sender = student["sender"]
+    current = student["department"] or '-'
+    if not sender:
+        return f'<td>{_format_cell(current)}</td>'
+    nick = _attr(sender)
+    nick_arg = _js_arg(sender)
+    options_html = _DEPARTMENT_OPTIONS.get(current)
+    if options_html is None:
+        options_html = ''.join(
+            f'<option value="{_attr(option)}">{_format_cell(option)}</option>' for option in DEPARTMENTS
+        )
+    return (
+        f'<td><select id="dept_{nick}" data-original="{_attr(current)}" '
+        f'onchange="onDepartmentChange({nick_arg})">{options_html}</select> '
+        f'<button id="dept_save_{nick}" onclick="updateDepartment({nick_arg})" '
+        f'style="display:none;">Save</button></td>'
+    )
+
+
+def _grade_cell(column, id_prefix):
+    """A plain cell with an id, so the page can patch it after a save."""
+    def render(student):
+        if not student["sender"]:
+            return f'<td>{_format_cell(student[column])}</td>'
+        return f'<td id="{id_prefix}{_attr(student["sender"])}">{_format_cell(student[column])}</td>'
+    return render
+
+
+SUMMARY_CELL_RENDERERS = {
+    'fio': _fio_cell,
+    'department': _department_cell,
+    'hw_hse_grade_rounded': _grade_cell('hw_hse_grade_rounded', 'hw_rounded_'),
+    'exam_hse_grade': _grade_cell('exam_hse_grade', 'exam_'),
+    'final_hse_grade': _grade_cell('final_hse_grade', 'final_'),
+}
+
+
+def _export_script(export_data):
+    # \\u003c keeps any '<' in a FIO from prematurely closing the script tag.
+    export_json = json.dumps(export_data, ensure_ascii=False).replace('<', '\\u003c')
+    return (
+        '<div style="margin: 20px 0;">'
+        '<button onclick="downloadGradesCsv()">Скачать CSV (ФИО + оценки)</button>'
+        '</div>\n'
+        '<script>\n'
+        f'const GRADES_EXPORT = {export_json};\n'
+        'function csvCell(v){v=String(v==null?"":v);'
+        'return /[",\\r\\n;]/.test(v)?\'"\'+v.replace(/"/g,\'""\')+\'"\':v;}\n'
+        'function downloadGradesCsv(){\n'
+        '  const rows=[["ФИО","Программа","Накоп","Экзамены","Итог"]];\n'
+        '  for(const r of GRADES_EXPORT){rows.push([r.fio,r.dept,r.hw,r.exam,r.final]);}\n'
+        '  const csv=rows.map(row=>row.map(csvCell).join(",")).join("\\r\\n");\n'
+        '  const blob=new Blob(["\\ufeff"+csv],{type:"text/csv;charset=utf-8;"});\n'
+        '  const url=URL.createObjectURL(blob);\n'
+        '  const a=document.createElement("a");a.href=url;a.download="grades.csv";\n'
+        '  document.body.appendChild(a);a.click();document.body.removeChild(a);URL.revokeObjectURL(url);\n'
+        '}\n'
+        '</script>\n'
+    )
+
+
+def iter_summary_page(summary, result_rows, known_homeworks, hw_to_max_points):
+    """Yield the summary page in one pass over the students, chunk by chunk."""
+    students = summary["students"]
+    yield _export_script(summary["export_data"])
+    yield JS_CODE
+    yield STYLE_CSS
+    yield from iter_table(SUMMARY_COLUMNS, students, cell_renderers=SUMMARY_CELL_RENDERERS)
+
+    # Add statistics for filled fios
+    filled_fios = sum(1 for student in students if student["fio"] is not None)
+    yield f'<p></p><p>Filled FIOs: {filled_fios}/{len(students)}</p><p></p>'
+
+    # Add homework statistics table
+    try:
+        stats_columns = ['homework', 'students_with_points', 'students_with_full_score', 'avg_score', 'max_points']
+        stats_data = _homework_stats(result_rows, known_homeworks, hw_to_max_points)
+        yield "\n<h2>Homework Statistics</h2>\n" + render_table(stats_columns, stats_data, index=False)
+    except Exception as e:
+        print(f"cant calculate homework stats error: {e}")
+
+    fio_collisions = summary["fio_collisions"]
+    orphan_exam_fios = summary["orphan_exam_fios"]
+    if fio_collisions or orphan_exam_fios:
+        yield "\n<h2>Exam matching warnings</h2>\n"
+        if fio_collisions:
+            yield "<p>FIO collisions (exam result already used by another student, skipped):</p>\n<ul>\n"
+            for sender, key in fio_collisions:
+                yield f"<li>{_format_cell(sender)} &rarr; {_format_cell(key)}</li>\n"
+            yield "</ul>\n"
+        if orphan_exam_fios:
+            yield "<p>Orphan exam rows (matched no student):</p>\n<ul>\n"
+            for fio_key in orphan_exam_fios:
+                yield f"<li>{_format_cell(fio_key)}</li>\n"
+            yield "</ul>\n"
+
+    if summary["no_fio_with_grade"]:
+        yield "\n<h2>Студенты с оценкой ≥ 4 без заполненного ФИО</h2>\n<ul>\n"
+        for sender in summary["no_fio_with_grade"]:
+            yield f"<li>{_format_cell(sender)}</li>\n"
+        yield "</ul>\n"
+
+
+def render_summary_page(summary, result_rows, known_homeworks, hw_to_max_points):
+    return ''.join(iter_summary_page(summary, result_rows, known_homeworks, hw_to_max_points))
+
+
+def _detailed_stats(result_rows):
+    stats = {}
+    for row in result_rows:
+        hw_stats = stats.setdefault(row["homework"], {'homework': row["homework"], 'non_zero_solutions': 0, 'full_solutions': 0})
+        hw_stats['non_zero_solutions'] += row["result_points"] > 0
+        hw_stats['full_solutions'] += row["result_points"] == row["max_points"]
+    return [stats[hw_name] for hw_name in sorted(stats)]
+
+
+def iter_detailed_page(result_rows):
+    yield JS_CODE
+    yield STYLE_CSS
+    yield from iter_table(DETAILED_COLUMNS, result_rows)
+
+    # Per homework statistics:
+    # 1. Count of non zero solutions
+    # 2. Count of full solutions
+    try:
+        stats_rows = _detailed_stats(result_rows)
+        yield "\n<h2>Stats</h2>\n" + render_table(['homework', 'non_zero_solutions', 'full_solutions'], stats_rows)
+    except Exception as e:
+        print(f"cant calculate stats error: {e}")
+
+
+def render_detailed_page(result_rows):
+    return ''.join(iter_detailed_page(result_rows))
+
+
+def _json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _columnar(columns, rows):
+    """{column: [value per row]} - keys are sent once instead of once per row."""
+    return {column: [_json_value(row[column]) for row in rows] for column in columns}
+
+
+def summary_data(summary, result_rows, known_homeworks, hw_to_max_points):
+    """Data of the summary page for the client-rendered view (grades-app.html)."""
+    stats_columns = ['homework', 'students_with_points', 'students_with_full_score', 'avg_score', 'max_points']
+    return {
+        "view": "summary",
+        "departments": DEPARTMENTS,
+        "students": _columnar(SUMMARY_COLUMNS, summary["students"]),
+        "homework_stats": _columnar(stats_columns, _homework_stats(result_rows, known_homeworks, hw_to_max_points)),
+        "fio_collisions": summary["fio_collisions"],
+        "orphan_exam_fios": summary["orphan_exam_fios"],
+        "no_fio_with_grade": summary["no_fio_with_grade"],
+    }
+
+
+def detailed_data(result_rows):
+    """Data of the detailed page for the client-rendered view (grades-app.html)."""
+    return {
+        "view": "detailed",
+        "rows": _columnar(DETAILED_COLUMNS, result_rows),
+        "stats": _columnar(['homework', 'non_zero_solutions', 'full_solutions'], _detailed_stats(result_rows)),
+    }
+
+
+def student_data(student, result_rows, bonuses):
+    """One student's grade breakdown for handler_student."""
+    return {
+        "github_nick": student["sender"],
+        **{column: _json_value(student[column]) for column in SUMMARY_COLUMNS if column != "sender"},
+        "submissions": [{column: _json_value(row[column]) for column in DETAILED_COLUMNS} for row in result_rows],
+        "bonuses": [{"homework": bonus["homework"], "bonus_points": bonus["bonus_points"]} for bonus in bonuses],
+    }
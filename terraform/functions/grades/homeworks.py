@@ -0,0 +1,172 @@
+"""Homework metadata (hw-meta.json), repo name -> homework resolution and
+parsing of check_run fields.
+
+Shared by the grades function and the GitHub webhook handler: the Makefile
+packs this module and hw-meta.json into both function zips.
+"""
+import datetime
+import json
+import os
+import re
+
+META_PATH = os.path.join(os.path.dirname(__file__), "hw-meta.json")
+
+# Classroom repos are named "fintech-dl-hse-<homework id>-<github login>[-<n>]".
+REPO_PREFIX = 'fintech-dl-hse-'
+
+_ATTEMPT_SUFFIX_RE = re.compile(r'-\d+$')
+
+# Hardcoded penalty days by repo name (without the "fintech-dl-hse-" prefix).
+# Here rather than in the grades function, so the webhook's best_submissions
+# upsert applies them too.
+FORCED_PENALTY_DAYS = {
+    "hw-mlp-rakhamidullin": 0,
+    "hw-activations-rakhamidullin": 0,
+    "hw-weight-init-rakhamidullin": 0,
+}
+
+# Each day late costs 10% of the points, for at most this many days.
+MAX_PENALTY_DAYS = 3
+
+# GitHub apps (classroom, dependabot, ...) post check runs as "<name>[bot]".
+BOT_SENDER_SUFFIX = '[bot]'
+
+# check_run_summary looks like "Points 80/100".
+POINTS_RE = re.compile(r'^[^ ]* (\d+)/(\d+)')
+
+
+def load_known_homeworks(meta_path=META_PATH):
+    with open(meta_path, encoding="utf-8") as f:
+        raw_list = json.load(f)
+    known_homeworks = {}
+    deadline_offset = datetime.timedelta(hours=3, minutes=5, seconds=1)
+    for item in raw_list:
+        hw_id = item["id"]
+        deadline = datetime.datetime.strptime(item["deadline"], "%Y-%m-%dT%H:%M:%S")
+        known_homeworks[hw_id] = {
+            "deadline": deadline + deadline_offset,
+            "bonus": item.get("bonus", False),
+            "max_points": item.get("max_points", 0),
+        }
+    return known_homeworks
+
+
+class HomeworkIndex:
+    """Longest-prefix lookup of homework ids in classroom repo names.
+
+    Ids are stored in a character trie, so resolving a name is O(len(name)).
+    Ids may be prefixes of each other ("hw-mlp" and "hw-mlp-advanced"): the
+    longest id followed by a '-' wins.
+    """
+
+    _END = None  # trie key marking a complete homework id
+
+    def __init__(self, homework_ids):
+        self._trie = {}
+        for hw_id in homework_ids:
+            node = self._trie
+            for ch in hw_id:
+                node = node.setdefault(ch, {})
+            node[self._END] = hw_id
+
+    def resolve(self, repo_name):
+        """Return (homework_id, student_login) for a repo name, or None.
+
+        The "fintech-dl-hse-" prefix is optional and a trailing "-<digits>"
+        (classroom's name de-duplication) is dropped from the login.
+        """
+        name = repo_name.removeprefix(REPO_PREFIX)
+        node = self._trie
+        homework_end = None
+        for i, ch in enumerate(name):
+            if ch == '-' and self._END in node:
+                homework_end = i
+            node = node.get(ch)
+            if node is None:
+                break
+        if homework_end is None:
+            return None
+        student_login = _ATTEMPT_SUFFIX_RE.sub('', name[homework_end + 1:])
+        if not student_login:
+            return None
+        return name[:homework_end], student_login
+
+
+def load_homework_index(known_homeworks=None):
+    if known_homeworks is None:
+        known_homeworks = load_known_homeworks()
+    return HomeworkIndex(known_homeworks.keys())
+
+
+def parse_points(check_run_summary):
+    """(points, max_points) from a "Points X/Y" summary, or None."""
+    match = POINTS_RE.match(check_run_summary or '')
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def parse_completed_at(completed_at_str):
+    """check_run completed_at ("2026-03-01T12:00:00Z") as a naive UTC datetime, or None."""
+    if not completed_at_str:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(completed_at_str[:19])
+    except ValueError:
+        return None
+
+
+def parse_check_run(homework_index, repo_name, check_run_summary, completed_at_str):
+    """Typed columns of a github_events_log_v3 row, parsed once at ingestion.
+
+    Returns a dict of homework, student_login, points, max_points and
+    completed_at; a field that can't be parsed (a repo of no known homework,
+    a summary without points, a check run that hasn't completed) is None.
+    """
+    resolved = homework_index.resolve(repo_name) if repo_name else None
+    homework, student_login = resolved if resolved else (None, None)
+    points = parse_points(check_run_summary)
+    return {
+        'homework': homework,
+        'student_login': student_login,
+        'points': points[0] if points else None,
+        'max_points': points[1] if points else None,
+        'completed_at': parse_completed_at(completed_at_str),
+    }
+
+
+def drop_reason(sender, parsed):
+    """Why a check run doesn't count for grading, or None if it does.
+
+    parsed is parse_check_run of the event. These are the rules
+    grading.parse_events applies on read; the webhook checks them before
+    writing, so such events never reach the log - except unknown_repo: the
+    homework may only be missing from the hw-meta.json the webhook was
+    deployed with. Those events are logged with NULL typed columns, which
+    grading.parse_events parses on read with its own hw-meta.json, and aren't
+    folded into best_submissions. Once a homework is added, the grades
+    function's reparse-events and rebuild-best-submissions commands bring
+    its earlier events in.
+    """
+    if not sender or sender.endswith(BOT_SENDER_SUFFIX):
+        return 'bot_sender'
+    if parsed['homework'] is None:
+        return 'unknown_repo'
+    if parsed['points'] is None:
+        return 'no_points'
+    if parsed['completed_at'] is None:
+        return 'no_completed_at'
+    return None
+
+
+def penalty_days(completed_at, deadline, forced_penalty_days=None):
+    """Days of late penalty: every started day past the deadline, capped.
+
+    forced_penalty_days (from FORCED_PENALTY_DAYS) overrides the computed value.
+    """
+    if forced_penalty_days is not None:
+        return float(forced_penalty_days)
+    late_seconds = (completed_at - deadline).total_seconds()
+    return min(late_seconds // 86400 + 1, MAX_PENALTY_DAYS) if late_seconds > 0 else 0.0
+
+
+def penalized_points(points, penalty_days):
+    return points * (100 - penalty_days * 10) / 100
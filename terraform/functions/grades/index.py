@@ -1,35 +1,19 @@
 import argparse
+import base64
+import concurrent.futures
 import datetime
-import re
-import pandas as pd
+import gzip
+import hashlib
 import sys
 import json
 import os
 from collections import OrderedDict
 
 import ydb
-import ydb.iam
-
-import numpy as np
-
-# Max raw exam points; 'Сумма баллов за экзамены' is scaled by this to the 0-2 exam grade.
-EXAM_MAX = 2
-
-
-def normalize_fio(value):
-    """Canonical FIO form, shared verbatim with the bot's ingestion side.
-
-    Steps (order matters): drop '<'/'>'/'"' -> lowercase -> e-yo fold ->
-    collapse whitespace. Word order is preserved, so matching is order-sensitive.
-    """
-    if not value:
-        return ""
-    s = str(value)
-    s = s.replace("<", "").replace(">", "").replace('"', "")
-    s = s.lower().replace("ё", "е")  # ё -> е
-    s = " ".join(s.split())
-    return s
 
+import grading
+import homeworks
+import ydb_pool
 
 def _col_str(value):
     """Normalize a YDB text column to str.
@@ -42,19 +26,8 @@ def _col_str(value):
     return value.decode('utf-8') if isinstance(value, bytes) else str(value)
 
 
-# Create driver in global space.
-driver = ydb.Driver(
-  endpoint=os.getenv('YDB_ENDPOINT'),
-  database=os.getenv('YDB_DATABASE'),
-  credentials=ydb.iam.MetadataUrlCredentials(),
-)
-
-# Wait for the driver to become active for requests.
-
-driver.wait(fail_fast=True, timeout=5)
-
-# Create the session pool instance to manage YDB sessions.
-pool = ydb.QuerySessionPool(driver)
+# Created lazily on the first query and reused across warm invocations.
+pool = ydb_pool.LazyPool()
 
 
 def _force_hw_grades():
@@ -85,204 +58,500 @@ def _force_hw_bonuses():
     ]
 
 
-def _load_known_homeworks():
-    meta_path = os.path.join(os.path.dirname(__file__), "hw-meta.json")
-    with open(meta_path, encoding="utf-8") as f:
-        raw_list = json.load(f)
-    known_homeworks = {}
-    deadline_offset = datetime.timedelta(hours=3, minutes=5, seconds=1)
-    for item in raw_list:
-        hw_id = item["id"]
-        deadline = datetime.datetime.strptime(item["deadline"], "%Y-%m-%dT%H:%M:%S")
-        known_homeworks[hw_id] = {
-            "deadline": deadline + deadline_offset,
-            "bonus": item.get("bonus", False),
-            "max_points": item.get("max_points", 0),
-        }
-    return known_homeworks
+# No LIMIT: the current term's log after $since is streamed, see _handler.
+# [$since, $until) is a key range of the event_time index (ydb/003), so
+# earlier terms aren't read. homework .. completed_at are parsed by the webhook
+# at ingestion and NULL where they didn't parse, which grading.parse_events
+# parses from the raw strings instead.
+EVENTS_QUERY = '''
+    DECLARE $since AS Date;
+    DECLARE $until AS Date;
+
+    SELECT sender, repo_name, completed_at_str, check_run_summary, event_time,
+        homework, student_login, points, max_points, completed_at
+    FROM github_events_log_v3 VIEW idx_event_time
+    WHERE event_time >= $since
+        AND event_time < $until
+        AND check_run_summary != "";
+'''
+
+
+def _term_bounds(now=None):
+    """[start, end) of the current term: the UTC calendar year, as the course
+    runs in spring. Also the scope of the grades snapshot."""
+    now = now or datetime.datetime.utcnow()
+    return datetime.datetime(now.year, 1, 1), datetime.datetime(now.year + 1, 1, 1)
+
+
+def _events_range_params(since, until):
+    """$since/$until as dates: event_time is a Date column, so a Timestamp
+    bound would be a cast of the key rather than a key range."""
+    def as_date(value):
+        return value.date() if isinstance(value, datetime.datetime) else value
+    return {
+        '$since': (as_date(since), ydb.PrimitiveType.Date),
+        '$until': (as_date(until), ydb.PrimitiveType.Date),
+    }
 
 
-def _handler(event, context, detailed=False):
+# YQL-side twin of grading.parse_events + grading.merge_best_submission:
+# resolves the homework, parses "Points X/Y", applies the deadline penalty and
+# keeps one best row per (student, homework), so only O(students x homeworks)
+# rows come back.
+BEST_SUBMISSIONS_QUERY = '''
+    DECLARE $homeworks AS List<Struct<id: Utf8, deadline: Timestamp>>;
+    DECLARE $forced_penalty_days AS Dict<Utf8, Int32>;
+    DECLARE $since AS Date;
+    DECLARE $until AS Date;
+
+    $points_re = Re2::Capture(@@^[^ ]* ([0-9]+)/([0-9]+)@@);
+    $attempt_suffix_re = Re2::Replace(@@-[0-9]+$@@);
+
+    $log = (
+        SELECT sender, repo_name, completed_at_str, check_run_summary, event_time
+        FROM github_events_log_v3 VIEW idx_event_time
+        WHERE event_time >= $since
+            AND event_time < $until
+            AND check_run_summary != ""
+    );
+
+    $events = (
+        SELECT
+            IF(StartsWith(repo_name, "fintech-dl-hse-"), Unicode::Substring(repo_name, 15), repo_name) AS repo,
+            CAST(completed_at_str AS Timestamp) AS completed_at,
+            $points_re(check_run_summary) AS points
+        FROM $log
+        WHERE NOT EndsWith(sender, "[bot]")
+    );
+
+    -- Longest homework id followed by '-' wins, like homeworks.HomeworkIndex.
+    $repo_homework = (
+        SELECT
+            r.repo AS repo,
+            MAX_BY(AsStruct(hw.id AS id, hw.deadline AS deadline), Unicode::GetLength(hw.id)) AS hw
+        FROM (SELECT DISTINCT repo FROM $events) AS r
+        CROSS JOIN AS_TABLE($homeworks) AS hw
+        WHERE StartsWith(r.repo, hw.id || "-")
+        GROUP BY r.repo
+    );
+
+    $matched = (
+        SELECT
+            e.repo AS repo,
+            e.completed_at AS completed_at,
+            CAST(e.points._1 AS Int32) AS points,
+            CAST(e.points._2 AS Int32) AS max_points,
+            rh.hw.id AS homework,
+            e.completed_at - rh.hw.deadline AS late_by
+        FROM $events AS e
+        INNER JOIN $repo_homework AS rh ON e.repo = rh.repo
+        WHERE e.points._1 IS NOT NULL AND e.completed_at IS NOT NULL
+    );
+
+    $penalized = (
+        SELECT
+            CAST($attempt_suffix_re(Unicode::Substring(repo, Unicode::GetLength(homework) + 1), "") AS Utf8) AS sender,
+            homework,
+            completed_at,
+            points,
+            max_points,
+            COALESCE(
+                DictLookup($forced_penalty_days, repo),
+                IF(late_by > Interval("PT0S"), MIN_OF(CAST(DateTime::ToSeconds(late_by) / 86400 AS Int32) + 1, 3), 0)
+            ) AS penalty_days
+        FROM $matched
+    );
+
+    -- HomeworkIndex.resolve rejects repos with nothing left for the login.
+    $students = (
+        SELECT * FROM $penalized WHERE sender != ""
+    );
+
+    $scored = (
+        SELECT
+            sender,
+            homework,
+            completed_at,
+            max_points,
+            penalty_days,
+            penalty_days * 10 AS penalty_percent,
+            CAST(points AS Double) * (100 - penalty_days * 10) / 100.0 AS result_points
+        FROM $students
+    );
+
+    $best = (
+        SELECT MAX_BY(TableRow(), AsTuple(result_points, completed_at)) AS best
+        FROM $scored
+        GROUP BY sender, homework
+    );
+
+    SELECT * FROM $best FLATTEN COLUMNS;
+
+    SELECT MAX(event_time) AS watermark FROM $log;
+'''
+
+
+def _load_best_submissions_yql(known_homeworks, forced_penalty_days, since, until):
+    """Run BEST_SUBMISSIONS_QUERY over events in [since, until).
+
+    Returns (submission dicts, max event_time seen or None).
+    """
+    homeworks_type = ydb.ListType(
+        ydb.StructType()
+        .add_member('id', ydb.PrimitiveType.Utf8)
+        .add_member('deadline', ydb.PrimitiveType.Timestamp)
+    )
+    forced_type = ydb.DictType(ydb.PrimitiveType.Utf8, ydb.PrimitiveType.Int32)
+    result_sets = pool.execute_with_retries(BEST_SUBMISSIONS_QUERY, {
+        '$homeworks': (
+            [{'id': hw_id, 'deadline': meta['deadline']} for hw_id, meta in known_homeworks.items()],
+            homeworks_type,
+        ),
+        '$forced_penalty_days': (
+            {repo: int(days) for repo, days in forced_penalty_days.items()},
+            forced_type,
+        ),
+        **_events_range_params(since, until),
+    })
+
+    submissions = []
+    for row in result_sets[0].rows:
+        submissions.append({
+            "sender": _col_str(row.sender),
+            "max_points": row.max_points,
+            "result_points": row.result_points,
+            "homework": _col_str(row.homework),
+            # Same dtype as the Python path produces for late submissions.
+            "penalty_days": float(row.penalty_days),
+            "penalty_percent": float(row.penalty_percent),
+            "completed_at": row.completed_at,
+        })
+    watermark_rows = result_sets[1].rows if len(result_sets) > 1 else []
+    watermark = _as_datetime(watermark_rows[0].watermark) if watermark_rows else None
+    return submissions, watermark
+
+
+# Maintained by the webhook (ydb/005_best_submissions.sql): one row per
+# (term, student, homework), already penalized.
+BEST_SUBMISSIONS_TABLE_QUERY = '''
+    DECLARE $term AS Uint32;
+    SELECT student_login, homework, max_points, penalty_days, result_points, completed_at
+    FROM best_submissions
+    WHERE term = $term;
+'''
+
+
+def _load_best_submissions_table(term):
+    """Submission dicts of the term from the best_submissions table."""
+    result_sets = pool.execute_with_retries(
+        BEST_SUBMISSIONS_TABLE_QUERY, {'$term': (term, ydb.PrimitiveType.Uint32)})
+    submissions = []
+    for result_set in result_sets:
+        for row in result_set.rows:
+            penalty_days = float(row.penalty_days or 0)
+            submissions.append({
+                "sender": _col_str(row.student_login),
+                "max_points": row.max_points,
+                "result_points": row.result_points,
+                "homework": _col_str(row.homework),
+                "penalty_days": penalty_days,
+                "penalty_percent": penalty_days * 10,
+                "completed_at": row.completed_at,
+            })
+    return submissions
+
+
+# Regenerates a term of best_submissions in one transaction: the term's rows
+# are deleted (the DELETE reads the table, so it goes first) and the rebuilt
+# ones upserted. The grades_versions stamp invalidates cached pages (ETag).
+REPLACE_BEST_SUBMISSIONS_QUERY = '''
+    DECLARE $term AS Uint32;
+    DECLARE $rows AS List<Struct<
+        student_login: Utf8, homework: Utf8, max_points: Int32,
+        penalty_days: Int32, result_points: Double, completed_at: Timestamp>>;
+
+    DELETE FROM best_submissions ON
+    SELECT term, student_login, homework FROM best_submissions WHERE term = $term;
+
+    UPSERT INTO best_submissions
+        (term, student_login, homework, max_points, penalty_days, result_points, completed_at, updated_at)
+    SELECT $term AS term, student_login, homework, max_points, penalty_days, result_points, completed_at,
+        CurrentUtcTimestamp() AS updated_at
+    FROM AS_TABLE($rows);
+
+    UPSERT INTO grades_versions (name, changed_at)
+    VALUES ("best_submissions", CurrentUtcTimestamp());
+'''
+
+BEST_SUBMISSIONS_ROWS_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('student_login', ydb.PrimitiveType.Utf8)
+    .add_member('homework', ydb.PrimitiveType.Utf8)
+    .add_member('max_points', ydb.PrimitiveType.Int32)
+    .add_member('penalty_days', ydb.PrimitiveType.Int32)
+    .add_member('result_points', ydb.PrimitiveType.Double)
+    .add_member('completed_at', ydb.PrimitiveType.Timestamp)
+)
 
-    accumulated_data = []
 
-    known_homeworks = _load_known_homeworks()
+def rebuild_best_submissions(year):
+    """Regenerate the best_submissions rows of a term from the events log.
 
-    forced_penalty_days = {
-        "hw-mlp-rakhamidullin": 0,
-        "hw-activations-rakhamidullin": 0,
-        "hw-weight-init-rakhamidullin": 0,
-    }
+    Scans the term's events with the same parsing and merge as the grades
+    pages and replaces the term's rows. Returns the number of rows written.
+    Events the webhook folds in while the scan runs can be overwritten; run
+    it again if that matters.
+    """
+    known_homeworks = homeworks.load_known_homeworks()
+    homework_index = homeworks.HomeworkIndex(known_homeworks.keys())
+    term_start, term_end = _term_bounds(datetime.datetime(year, 1, 1))
+    best_submissions = grading.SubmissionTable()
+
+    def scan(session):
+        # Called again from scratch on retry.
+        best_submissions.clear()
+        with session.execute(EVENTS_QUERY, _events_range_params(term_start, term_end)) as result_sets:
+            for result_set in result_sets:
+                for submission in grading.parse_events(
+                        result_set.rows, known_homeworks, homework_index, FORCED_PENALTY_DAYS):
+                    grading.merge_best_submission(best_submissions, submission)
+
+    pool.retry_operation_sync(scan)
+    rows = [
+        {
+            'student_login': s["sender"],
+            'homework': s["homework"],
+            'max_points': s["max_points"],
+            'penalty_days': int(s["penalty_days"]),
+            'result_points': s["result_points"],
+            'completed_at': s["completed_at"],
+        }
+        for s in best_submissions.values()
+    ]
+    pool.execute_with_retries(REPLACE_BEST_SUBMISSIONS_QUERY, {
+        '$term': (year, ydb.PrimitiveType.Uint32),
+        '$rows': (rows, BEST_SUBMISSIONS_ROWS_TYPE),
+    })
+    return len(rows)
+
+
+# A term's events logged while their repo matched no known homework
+# (homeworks.drop_reason "unknown_repo"), with NULL typed columns.
+UNPARSED_EVENTS_QUERY = '''
+    DECLARE $since AS Date;
+    DECLARE $until AS Date;
+
+    SELECT check_run_id, action, repo_name, check_run_summary, completed_at_str
+    FROM github_events_log_v3 VIEW idx_event_time
+    WHERE event_time >= $since
+        AND event_time < $until
+        AND homework IS NULL;
+'''
+
+REPARSED_EVENTS_QUERY = '''
+    DECLARE $rows AS List<Struct<
+        check_run_id: Uint64, action: Utf8, homework: Utf8?, student_login: Utf8?,
+        points: Int32?, max_points: Int32?, completed_at: Timestamp?>>;
+
+    UPDATE github_events_log_v3 ON SELECT * FROM AS_TABLE($rows);
+
+    UPSERT INTO grades_versions (name, changed_at)
+    VALUES ("github_events_log_v3", CurrentUtcTimestamp());
+'''
+
+REPARSED_EVENTS_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('check_run_id', ydb.PrimitiveType.Uint64)
+    .add_member('action', ydb.PrimitiveType.Utf8)
+    .add_member('homework', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('student_login', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('points', ydb.OptionalType(ydb.PrimitiveType.Int32))
+    .add_member('max_points', ydb.OptionalType(ydb.PrimitiveType.Int32))
+    .add_member('completed_at', ydb.OptionalType(ydb.PrimitiveType.Timestamp))
+)
 
-    known_homeworks_keys = sorted(list(known_homeworks.keys()), key=lambda x: len(x), reverse=True)
-    for i, hw_key_i in enumerate(known_homeworks_keys):
-        for hw_key_j in known_homeworks_keys[i+1:]:
-            if hw_key_i.startswith(hw_key_j) or hw_key_j.startswith(hw_key_i):
-                raise Exception(f"homework names must not starts with each other {hw_key_i}, {hw_key_j}")
-
-    query_result_set = pool.execute_with_retries('SELECT sender, repo_name, completed_at_str, check_run_summary FROM github_events_log_v2 WHERE check_run_summary != "" AND DateTime::GetYear(DateTime::Split(event_time)) == DateTime::GetYear(DateTime::Split(CurrentUtcDatetime())) LIMIT 10000')
-    print("len query_result_set", len(query_result_set))
-
-    hw_to_max_points = {}
-
-    for query_result in query_result_set:
-        for i, row in enumerate(query_result.rows):
-            sender = row.sender
-            repo_name = row.repo_name
-            repo_name = repo_name.removeprefix('fintech-dl-hse-')
-            completed_at_str = row.completed_at_str
-            check_run_summary = row.check_run_summary
-            # print("i", i, "repo_name", repo_name, "sender", sender, "check_run_summary", check_run_summary)
-
-            points = check_run_summary
-            if points is None or points == "":
-                # print(i, "SKIP no points summary")
-                continue
 
-            points = points.split(' ')[1]
+def reparse_events(year):
+    """Fill in the typed columns of a term's events whose homework is now known.
 
-            completed_at = datetime.datetime.strptime(completed_at_str, "%Y-%m-%dT%H:%M:%SZ")
+    The webhook logs a repo of no homework in its hw-meta.json with NULL typed
+    columns. After the homework is added, this parses them with the current
+    hw-meta.json, so the student page finds them; run rebuild-best-submissions
+    afterwards. Returns the number of events updated.
+    """
+    homework_index = homeworks.load_homework_index()
+    rows = []
 
-            if sender.endswith('[bot]'):
-                # print(i, "SKIP sender is bot")
-                continue
+    def scan(session):
+        # Called again from scratch on retry.
+        rows.clear()
+        term_params = _events_range_params(*_term_bounds(datetime.datetime(year, 1, 1)))
+        with session.execute(UNPARSED_EVENTS_QUERY, term_params) as result_sets:
+            for result_set in result_sets:
+                for row in result_set.rows:
+                    parsed = homeworks.parse_check_run(
+                        homework_index, _col_str(row.repo_name), _col_str(row.check_run_summary),
+                        _col_str(row.completed_at_str))
+                    if parsed['homework'] is not None:
+                        rows.append({'check_run_id': row.check_run_id, 'action': _col_str(row.action), **parsed})
 
-            homework = None
-            for homework_key in known_homeworks_keys:
-                if repo_name.startswith(homework_key):
-                    homework = homework_key
+    pool.retry_operation_sync(scan)
+    if rows:
+        pool.execute_with_retries(REPARSED_EVENTS_QUERY, {'$rows': (rows, REPARSED_EVENTS_TYPE)})
+    return len(rows)
 
-            if homework is None or homework not in known_homeworks:
-                continue
 
-            student_login = repo_name[len(homework)+1:]
-            student_login = re.sub(r'-\d+$', '', student_login)
-            # print("i", i, "repo_name", repo_name, "homework", homework, "student_login", student_login)
+def _as_datetime(value):
+    """event_time may come back as a date (it is written with CurrentUtcDate())."""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time())
 
-            deadline: datetime.datetime = known_homeworks[homework]['deadline']
 
-            penalty_days = 0
+# Bump to invalidate persisted snapshots when their layout or semantics change.
+SNAPSHOT_FORMAT_VERSION = 2
 
-            deadline_delta = (completed_at - deadline)
-            deadline_seconds = deadline_delta.total_seconds()
-            if deadline_delta > datetime.timedelta(seconds=0):
-                penalty_days = (deadline_seconds // 86400) + 1
-                penalty_days = min(penalty_days, 3)
+# In-process copy of the last snapshot, reused by warm invocations:
+# name -> {"fingerprint", "watermark", "best_submissions"}.
+_snapshot_cache = {}
 
-            if repo_name in forced_penalty_days:
-                penalty_days = forced_penalty_days[repo_name]
-                # print(f"use forced penalty days for {repo_name}: {penalty_days}")
 
-            penalty_percent = penalty_days * 10
+def _hw_meta_hash():
+    with open(homeworks.META_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-            max_points = int(points.split('/')[1])
-            result_points = int(points.split('/')[0]) * (100 - penalty_percent) / 100
 
-            accumulated_data.append({
-                "sender": student_login,
+def _snapshot_fingerprint(forced_penalty_days):
+    """Anything that changes how events turn into submissions invalidates a snapshot."""
+    digest = hashlib.sha256()
+    digest.update(_hw_meta_hash().encode("utf-8"))
+    digest.update(json.dumps(forced_penalty_days, sort_keys=True).encode("utf-8"))
+    digest.update(str(SNAPSHOT_FORMAT_VERSION).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_grades_snapshot(name, fingerprint):
+    """Return the stored best-submission state if it was built with `fingerprint`.
+
+    Returns (watermark, best_submissions as a grading.SubmissionTable) or
+    (None, empty table) when there is nothing usable, in which case the caller
+    rescans the whole log.
+    """
+    cached = _snapshot_cache.get(name)
+    if cached is None:
+        try:
+            result_sets = pool.execute_with_retries('''
+                DECLARE $name as UTF8;
+                SELECT fingerprint, watermark, best_submissions FROM grades_snapshot WHERE name = $name;
+            ''', {'$name': name})
+            rows = result_sets[0].rows
+        except Exception as e:
+            print(f"cant load grades snapshot error: {e}")
+            rows = []
+        if not rows:
+            return None, grading.SubmissionTable()
+        payload = rows[0].best_submissions
+        if isinstance(payload, (str, bytes)):
+            payload = json.loads(payload)
+        best_submissions = grading.SubmissionTable()
+        for sender, homework, max_points, result_points, penalty_days, completed_at in payload:
+            best_submissions[(sender, homework)] = {
+                "sender": sender,
                 "max_points": max_points,
                 "result_points": result_points,
                 "homework": homework,
                 "penalty_days": penalty_days,
-                "penalty_percent": penalty_percent,
-                "completed_at": completed_at,
-            })
-
-            hw_to_max_points[homework] = max_points
+                "penalty_percent": penalty_days * 10,
+                "completed_at": datetime.datetime.fromisoformat(completed_at),
+            }
+        cached = {
+            "fingerprint": _col_str(rows[0].fingerprint),
+            "watermark": _as_datetime(rows[0].watermark),
+            "best_submissions": best_submissions,
+        }
+        _snapshot_cache[name] = cached
 
-    # Hands forced grades
-    accumulated_data += _force_hw_grades()
-
-    df = pd.DataFrame(accumulated_data)
-
-    # Sort by completion time descending to handle ties (prefer latest submission)
-    # then find the index of the row with the maximum result_points for each group
-    idx = df.sort_values('completed_at', ascending=False)\
-            .groupby(['sender', 'homework'])['result_points']\
-            .idxmax()
-
-    # Select the rows using the obtained indices - these are the best submissions
-    result_df = df.loc[idx].copy()
-
-    # Apply bonus points on top of best submission (may exceed homework max_points)
-    for bonus in _force_hw_bonuses():
-        sender = bonus["sender"]
-        homework = bonus["homework"]
-        bonus_points = bonus["bonus_points"]
-        mask = (result_df['sender'] == sender) & (result_df['homework'] == homework)
-        if mask.any():
-            result_df.loc[mask, 'result_points'] = result_df.loc[mask, 'result_points'] + bonus_points
-        else:
-            hw_max_points_for_bonus = known_homeworks.get(homework, {}).get("max_points", 0)
-            new_row = pd.DataFrame([{
-                "sender": sender,
-                "max_points": hw_max_points_for_bonus,
-                "result_points": bonus_points,
-                "homework": homework,
-                "penalty_days": 0,
-                "penalty_percent": 0,
-                "completed_at": datetime.datetime.utcnow(),
-            }])
-            result_df = pd.concat([result_df, new_row], ignore_index=True)
-
-    # Calculate total points using the best submissions
-    result_total_df = result_df.groupby('sender')['result_points'].sum().reset_index()
-
-    # Always initialize fio/department so rendering never KeyErrors even when
-    # the YDB enrichment below fails (e.g. the department column is missing).
-    result_total_df['fio'] = None
-    # Department cell carries the nick + current value as a sentinel so the
-    # HTML render can replace it with a <select> regardless of column order.
-    result_total_df['department'] = result_total_df['sender'].apply(
-        lambda nick: f"DEPTCELL::{nick}::-"
-    )
+    if cached["fingerprint"] != fingerprint:
+        print("grades snapshot fingerprint changed, rebuilding")
+        return None, grading.SubmissionTable()
+    return cached["watermark"], cached["best_submissions"].copy()
 
-    all_senders = [x for x in set(result_total_df['sender']) if x != '']
-    placeholders = ', '.join([f'$github_nick{i}' for i in range(len(all_senders))])
-    declare_placeholders = '\n'.join([f'DECLARE $github_nick{i} as UTF8;' for i in range(len(all_senders))])
-    senders_query_params = {f'$github_nick{i}': all_senders[i] for i in range(len(all_senders))}
 
+def _save_grades_snapshot(name, fingerprint, watermark, best_submissions):
+    _snapshot_cache[name] = {
+        "fingerprint": fingerprint,
+        "watermark": watermark,
+        "best_submissions": best_submissions.copy(),
+    }
+    payload = [
+        [s["sender"], s["homework"], s["max_points"], s["result_points"], s["penalty_days"], s["completed_at"].isoformat()]
+        for s in best_submissions.values()
+    ]
     try:
-        query = f'{declare_placeholders} SELECT github_nick, fio FROM github_nick_to_fio WHERE github_nick IN ({placeholders})'
-        senders_fios = pool.execute_with_retries(query, senders_query_params)
-
-        senders_fios_dict = dict()
-        for row in senders_fios[0].rows:
-            senders_fios_dict[_col_str(row.github_nick)] = _col_str(row.fio)
+        pool.execute_with_retries('''
+            DECLARE $name as UTF8;
+            DECLARE $fingerprint as UTF8;
+            DECLARE $watermark as Timestamp;
+            DECLARE $best_submissions as Json;
 
-        print("senders_fios_dict", senders_fios_dict)
-        result_total_df['fio'] = result_total_df['sender'].map(senders_fios_dict)
+            UPSERT INTO grades_snapshot (name, fingerprint, watermark, best_submissions, updated_at)
+            VALUES ($name, $fingerprint, $watermark, $best_submissions, CurrentUtcTimestamp());
+        ''', {
+            '$name': name,
+            '$fingerprint': fingerprint,
+            '$watermark': (watermark, ydb.PrimitiveType.Timestamp),
+            '$best_submissions': (json.dumps(payload), ydb.PrimitiveType.Json),
+        })
     except Exception as e:
-        print(f"cant set fio error: {e}")
-        print(f"all_senders: {all_senders}")
+        print(f"cant save grades snapshot error: {e}")
+
+
+STUDENTS_INFO_QUERY = '''
+    DECLARE $github_nicks AS List<Utf8>;
+    SELECT github_nick, fio, department FROM github_nick_to_fio WHERE github_nick IN $github_nicks;
+'''
+
+# Fallback for a missing/broken department column, so it can't break fio.
+STUDENTS_FIO_QUERY = '''
+    DECLARE $github_nicks AS List<Utf8>;
+    SELECT github_nick, fio FROM github_nick_to_fio WHERE github_nick IN $github_nicks;
+'''
+
+
+def _load_students_info(github_nicks):
+    """Fetch fio and department for the given nicks in one round trip.
 
-    # Fetched separately so a missing/broken department column can't break fio.
+    The query text doesn't depend on the class size (the nicks go in a single
+    List<Utf8> parameter), so its plan is cached. Returns (fio by nick,
+    department by nick); a failed lookup leaves the dicts empty.
+    """
+    senders_fios_dict = dict()
     senders_dept_dict = dict()
+    if not github_nicks:
+        return senders_fios_dict, senders_dept_dict
+    params = {'$github_nicks': (list(github_nicks), ydb.ListType(ydb.PrimitiveType.Utf8))}
     try:
-        query = f'{declare_placeholders} SELECT github_nick, department FROM github_nick_to_fio WHERE github_nick IN ({placeholders})'
-        senders_dept = pool.execute_with_retries(query, senders_query_params)
-
-        for row in senders_dept[0].rows:
+        result_sets = pool.execute_with_retries(STUDENTS_INFO_QUERY, params)
+        for row in result_sets[0].rows:
+            senders_fios_dict[_col_str(row.github_nick)] = _col_str(row.fio)
             senders_dept_dict[_col_str(row.github_nick)] = _col_str(row.department)
-
-        result_total_df['department'] = result_total_df['sender'].apply(
-            lambda nick: f"DEPTCELL::{nick}::{senders_dept_dict.get(nick) or '-'}"
-        )
+        return senders_fios_dict, senders_dept_dict
     except Exception as e:
         print(f"cant set department error: {e}")
 
-    hw_max_points = sum(
-        meta["max_points"] for meta in known_homeworks.values()
-        if not meta.get("bonus", False)
-    )
-    print("hw_max_points", hw_max_points)
-    ratio = result_total_df['result_points'] / max(hw_max_points, 1)
-    hw_grade_numeric = ratio.clip(upper=1.0) * 8.0
-    result_total_df['hw_hse_grade'] = hw_grade_numeric.apply(lambda x: f"{x:.2f}")
-    result_total_df['hw_hse_grade_rounded'] = result_total_df['hw_hse_grade'].apply(lambda x: int(float(x) + 0.5))
-
-    # Exam grades: exact normalized-FIO match, each exam row used by at most one
-    # student. Collisions (same normalized FIO) and orphan exam rows are reported.
+    try:
+        result_sets = pool.execute_with_retries(STUDENTS_FIO_QUERY, params)
+        for row in result_sets[0].rows:
+            senders_fios_dict[_col_str(row.github_nick)] = _col_str(row.fio)
+    except Exception as e:
+        print(f"cant set fio error: {e}")
+        print(f"all_senders: {list(github_nicks)}")
+    return senders_fios_dict, senders_dept_dict
+
+
+
+def _load_exam_sum_by_fio():
+    """Normalized FIO -> raw exam points from exam_grades; empty on failure."""
     exam_sum_by_fio = {}
     try:
         exam_rows = pool.execute_with_retries('SELECT fio, exam_sum FROM exam_grades')
@@ -291,377 +560,326 @@ def _handler(event, context, detailed=False):
                 continue
             # Normalize the stored value too, so matching is robust even if a row
             # was written un-normalized.
-            fio_key = normalize_fio(_col_str(row.fio))
+            fio_key = grading.normalize_fio(_col_str(row.fio))
             if not fio_key:
                 continue
             exam_sum_by_fio[fio_key] = float(row.exam_sum) if row.exam_sum is not None else 0.0
     except Exception as e:
         print(f"cant load exam_grades error: {e}")
+    return exam_sum_by_fio
 
-    fio_by_sender = dict(zip(result_total_df['sender'], result_total_df['fio']))
-    used_exam_fios = set()
-    fio_collisions = []
-    exam_sum_by_sender = {}
-    for sender in sorted(fio_by_sender.keys()):
-        fio = fio_by_sender[sender]
-        key = normalize_fio(fio)
-        if not key or key not in exam_sum_by_fio:
-            continue
-        if key in used_exam_fios:
-            fio_collisions.append((sender, key))
-            continue
-        used_exam_fios.add(key)
-        exam_sum_by_sender[sender] = exam_sum_by_fio[key]
-    orphan_exam_fios = sorted(f for f in exam_sum_by_fio if f not in used_exam_fios)
-    print("exam fio_collisions", fio_collisions)
-    print("exam orphan_exam_fios", orphan_exam_fios)
-
-    exam_grade_by_sender = {
-        s: min(exam_sum_by_sender.get(s, 0.0) / EXAM_MAX, 1.0) * 2.0
-        for s in result_total_df['sender']
-    }
-    result_total_df['exam_hse_grade'] = result_total_df['sender'].apply(
-        lambda s: f"{exam_grade_by_sender.get(s, 0.0):.2f}"
-    )
-    # Final grade sums the exam grade with the ROUNDED homework grade.
-    final_numeric = (result_total_df['hw_hse_grade_rounded'] + result_total_df['sender'].map(exam_grade_by_sender).fillna(0.0)).clip(upper=10.0)
 
-    # Hardcoded final-grade overrides by github nick.
-    forced_final_grades = {
-        "Denisin": 4.0,
-    }
-    forced_mask = result_total_df['sender'].isin(forced_final_grades)
-    if forced_mask.any():
-        final_numeric = final_numeric.copy()
-        final_numeric.loc[forced_mask] = result_total_df.loc[forced_mask, 'sender'].map(forced_final_grades)
-
-    result_total_df['final_hse_grade'] = final_numeric.apply(lambda x: f"{x:.2f}")
-
-    # github nicks with a final grade >= 4 but no FIO filled in - surfaced at the
-    # bottom of the page so admins can chase them.
-    no_fio_with_grade = []
-    for sender, fio, final_grade in zip(
-        result_total_df['sender'], result_total_df['fio'], final_numeric
-    ):
-        has_fio = not pd.isna(fio) and str(fio).strip() != ''
-        if not has_fio and float(final_grade) >= 4:
-            no_fio_with_grade.append(sender)
-    no_fio_with_grade = sorted(s for s in no_fio_with_grade if s)
-
-    # Data for the client-side "download CSV" button: only students with a FIO.
-    export_data = []
-    for sender, fio, hw_rounded, exam_g, final_g in zip(
-        result_total_df['sender'],
-        result_total_df['fio'],
-        result_total_df['hw_hse_grade_rounded'],
-        result_total_df['exam_hse_grade'],
-        result_total_df['final_hse_grade'],
-    ):
-        if not pd.isna(fio) and str(fio).strip() != '':
-            export_data.append({
-                'fio': str(fio),
-                'dept': senders_dept_dict.get(sender) or '-',
-                'hw': str(hw_rounded),
-                'exam': str(exam_g),
-                'final': str(final_g),
-            })
+# Runs the handler's independent YDB reads concurrently; each task takes its
+# own session from the pool.
+_read_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
-    df_to_render = result_total_df
-    if detailed:
-        df_to_render = result_df
-
-    # Custom HTML rendering with input fields for NaN FIO values
-    def custom_html_render(df, detailed=False, result_df=None, known_homeworks=None, hw_to_max_points=None):
-        # Insert JavaScript function for making HTTP requests
-        js_code = """
-        <script>
-        function updateFio(github_nick, inputId='') {
-            const fioValue = inputId ?
-                document.getElementById(inputId).value :
-                document.getElementById('fio_' + github_nick).value;
-
-            const url = `https://functions.yandexcloud.net/d4e6tbb4ljr32is5gi0g?github_nick=${github_nick}&fio=${encodeURIComponent(fioValue)}`;
-
-            fetch(url)
-                .then(response => {
-                    if (response.ok) {
-                        window.location.reload();
-                    } else {
-                        alert('Failed to update FIO');
-                    }
-                })
-                .catch(error => {
-                    alert('Error: ' + error);
-                });
-        }
 
-        function editFio(github_nick) {
-            const text = document.getElementById('fio_text_' + github_nick);
-            const editButton = document.getElementById('fio_edit_' + github_nick);
-            if (text) text.style.display = 'none';
-            if (editButton) editButton.style.display = 'none';
-            document.getElementById('fio_' + github_nick).style.display = '';
-        }
+# Short-lived reuse; a reload still revalidates against the ETag.
+GRADES_CACHE_CONTROL = 'private, max-age=15'
 
-        function onFioChange(github_nick) {
-            const input = document.getElementById('fio_' + github_nick);
-            const button = document.getElementById('fio_save_' + github_nick);
-            button.style.display = (input.value !== input.dataset.original) ? '' : 'none';
-        }
 
-        function onDepartmentChange(github_nick) {
-            const select = document.getElementById('dept_' + github_nick);
-            const button = document.getElementById('dept_save_' + github_nick);
-            button.style.display = (select.value !== select.dataset.original) ? '' : 'none';
-        }
+def _header(event, name):
+    """Case-insensitive request header lookup."""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
 
-        function updateDepartment(github_nick) {
-            const department = document.getElementById('dept_' + github_nick).value;
-
-            const url = `https://functions.yandexcloud.net/d4e6tbb4ljr32is5gi0g?github_nick=${github_nick}&department=${encodeURIComponent(department)}`;
-
-            fetch(url)
-                .then(response => {
-                    if (response.ok) {
-                        window.location.reload();
-                    } else {
-                        alert('Failed to update department');
-                    }
-                })
-                .catch(error => {
-                    alert('Error: ' + error);
-                });
-        }
-        </script>
-        """
-
-        style_css = """
-        <style>
-            input::placeholder {
-                font-weight: bold;
-                opacity: 0.3;
-                color: red;
-            }
 
-            table.dataframe {
-                border-collapse: collapse;
-                font-family: Arial, sans-serif;
-                font-size: 14px;
-            }
+def _grades_etag(event, context, detailed):
+    """Cheap version key of everything the grades page is built from.
 
-            table.dataframe thead {
-                background-color: #f2f2f2;
-            }
+    Writers (the webhook, save_user_info, save_exam_grades) stamp their table in
+    grades_versions, so one small read replaces the aggregation. Returns None
+    when the versions can't be read; the page is then rendered uncached.
+    """
+    try:
+        result_sets = pool.execute_with_retries('SELECT name, changed_at FROM grades_versions')
+        versions = sorted(
+            (_col_str(row.name), str(row.changed_at)) for row in result_sets[0].rows
+        )
+    except Exception as e:
+        print(f"cant load grades_versions error: {e}")
+        return None
 
-            table.dataframe th,
-            table.dataframe td {
-                border: 1px solid #ccc;
-                padding: 8px 12px;
-                text-align: left;
-            }
+    digest = hashlib.sha256()
+    digest.update(json.dumps(versions).encode("utf-8"))
+    digest.update(_hw_meta_hash().encode("utf-8"))
+    # Forced grades and overrides live in the code, so a redeploy is a new version.
+    digest.update(str(getattr(context, 'function_version', '')).encode("utf-8"))
+    digest.update(json.dumps([detailed, event.get('queryStringParameters') or {}], sort_keys=True).encode("utf-8"))
+    return _weak_etag(digest.hexdigest())
 
-            table.dataframe tr:nth-child(even) {
-                background-color: #fafafa;
-            }
 
-            table.dataframe tr:hover {
-                background-color: #f1f1f1;
-            }
+def _weak_etag(hexdigest):
+    """ETags are weak: the identity, gzip and br bodies share one."""
+    return 'W/"' + hexdigest[:32] + '"'
 
-            input[type="text"] {
-                padding: 5px;
-                font-size: 14px;
-                width: 90%;
-                box-sizing: border-box;
-            }
 
-            button {
-                padding: 5px 10px;
-                font-size: 14px;
-                cursor: pointer;
-                background-color: #007bff;
-                border: none;
-                color: white;
-                border-radius: 4px;
-            }
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
 
-            button:hover {
-                background-color: #0056b3;
-            }
-        </style>
-        """
-
-        base_html = style_css + df.to_html()
-
-        # Process the HTML to make every FIO cell editable in place (and offer a
-        # fill-in input where FIO is still missing). Columns render one <td> per
-        # line, so we track the <td> index within each row: index 0 is the
-        # github_nick (sender) column and index 2 is the fio column.
-        if not detailed:
-            rows = base_html.split('\n')
-            td_index = -1
-            github_nick = None
-            for i, row in enumerate(rows):
-                stripped = row.strip()
-                if stripped.startswith('<tr>'):
-                    td_index = -1
-                    github_nick = None
-                    continue
-                if not stripped.startswith('<td>'):
-                    continue
-                td_index += 1
-                cell_value = row.split('<td>', 1)[1].rsplit('</td>', 1)[0]
-                if td_index == 0:  # github_nick (sender) column
-                    github_nick = cell_value.strip()
-                elif td_index == 2 and github_nick:  # fio column
-                    if cell_value.strip() == 'NaN':
-                        rows[i] = (
-                            f'<td><input placeholder="FILL FIO HERE!" type="text" '
-                            f'id="fio_{github_nick}" data-original="" '
-                            f'oninput="onFioChange(\'{github_nick}\')" style="width: 200px;"> '
-                            f'<button id="fio_save_{github_nick}" onclick="updateFio(\'{github_nick}\')" '
-                            f'style="display:none;">Save</button></td>'
-                        )
-                    else:
-                        rows[i] = (
-                            f'<td><span id="fio_text_{github_nick}">{cell_value}</span> '
-                            f'<button id="fio_edit_{github_nick}" onclick="editFio(\'{github_nick}\')" '
-                            f'title="Edit FIO" style="background:none;border:none;padding:0 4px;'
-                            f'cursor:pointer;filter:grayscale(1);opacity:0.45;font-size:14px;">✏️</button> '
-                            f'<input type="text" id="fio_{github_nick}" value="{cell_value}" '
-                            f'data-original="{cell_value}" oninput="onFioChange(\'{github_nick}\')" '
-                            f'style="width: 200px; display:none;"> '
-                            f'<button id="fio_save_{github_nick}" onclick="updateFio(\'{github_nick}\')" '
-                            f'style="display:none;">Save</button></td>'
-                        )
-
-            base_html = '\n'.join(rows)
-
-            # Replace department sentinel cells with a <select> + Save button.
-            def _render_department_cell(match):
-                github_nick = match.group(1)
-                current = match.group(2) or '-'
-                options_html = ''
-                for option in ['-', 'ФТиАД', 'ЭАД', 'ФЭН', 'ИПИИ']:
-                    selected = ' selected' if option == current else ''
-                    options_html += f'<option value="{option}"{selected}>{option}</option>'
-                return (
-                    f'<td><select id="dept_{github_nick}" data-original="{current}" '
-                    f'onchange="onDepartmentChange(\'{github_nick}\')">{options_html}</select> '
-                    f'<button id="dept_save_{github_nick}" onclick="updateDepartment(\'{github_nick}\')" '
-                    f'style="display:none;">Save</button></td>'
-                )
-
-            base_html = re.sub(r'<td>DEPTCELL::(.+?)::(.*?)</td>', _render_department_cell, base_html)
-
-            # Add statistics for filled fios
-            filled_fios = df[df['fio'].notna()].shape[0]
-            total_students = df.shape[0]
-            base_html += f'<p></p><p>Filled FIOs: {filled_fios}/{total_students}</p><p></p>'
-
-            # Add homework statistics table
-            if result_df is not None and known_homeworks is not None:
+
+# Bodies below this size aren't worth the CPU and base64 overhead.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+_brotli = None
+
+
+def _load_brotli():
+    """brotli, imported on the first br response; without it (a local run) responses fall back to gzip."""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def _accepted_encodings(accept_encoding):
+    """Content codings with q > 0 from an Accept-Encoding header."""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
                 try:
-                    stats_data = []
-                    for hw_name in known_homeworks.keys():
-                        hw_data = result_df[result_df['homework'] == hw_name]
-                        if len(hw_data) > 0:
-                            non_zero_count = (hw_data['result_points'] > 0).sum()
-                            full_score_count = (hw_data['result_points'] == hw_data['max_points']).sum()
-                            avg_score = hw_data['result_points'].mean()
-                            max_points = hw_data['max_points'].iloc[0]
-                        else:
-                            non_zero_count = 0
-                            full_score_count = 0
-                            avg_score = 0.0
-                            max_points = hw_to_max_points.get(hw_name, 0) if hw_to_max_points else 0
-
-                        stats_data.append({
-                            'homework': hw_name,
-                            'students_with_points': non_zero_count,
-                            'students_with_full_score': full_score_count,
-                            'avg_score': f"{avg_score:.2f}" if avg_score > 0 else "0.00",
-                            'max_points': max_points,
-                        })
-
-                    stats_df = pd.DataFrame(stats_data)
-                    base_html += "\n<h2>Homework Statistics</h2>\n" + stats_df.to_html(index=False)
-                except Exception as e:
-                    print(f"cant calculate homework stats error: {e}")
-        else:
-            # Per homework statistics:
-            # 1. Count of non zero solutions
-            # 2. Count of full solutions
-            try:
-                df['full_solution'] = df['result_points'] == df['max_points']
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
 
-                def count_non_zero_solutions(column):
-                    return (column > 0).sum()
 
-                df_stats = df.groupby('homework').agg({
-                    'result_points': [count_non_zero_solutions],
-                    'full_solution': ['sum']
-                }).reset_index()
-                df_stats.columns = ['homework', 'non_zero_solutions', 'full_solutions']
-                base_html += "\n<h2>Stats</h2>\n" + df_stats.to_html()
-            except Exception as e:
-                print(f"cant calculate stats error: {e}")
+def _compress_response(event, response):
+    """Compress a 200 response body per Accept-Encoding (br, then gzip).
 
+    The function gateway only passes binary bodies base64-encoded, hence
+    isBase64Encoded.
+    """
+    headers = response.setdefault('headers', {})
+    headers['Vary'] = 'Accept-Encoding'
+    body = response.get('body')
+    if response.get('statusCode') != 200 or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = _accepted_encodings(_header(event, 'Accept-Encoding'))
+    brotli = _load_brotli() if 'br' in accepted else False
+    if brotli:
+        compressed, encoding = brotli.compress(raw, quality=BROTLI_QUALITY), 'br'
+    elif 'gzip' in accepted or '*' in accepted:
+        compressed, encoding = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    else:
+        return response
+
+    print(f"response {encoding}: {len(raw)} -> {len(compressed)} bytes")
+    headers['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
+
+
+APP_PAGE_PATH = os.path.join(os.path.dirname(__file__), "grades-app.html")
+APP_PAGE_CACHE_CONTROL = 'public, max-age=3600'
+_app_page = None
+
+
+def _app_page_response(event):
+    """The static client-rendered page (?view=app); it fetches ?format=json itself."""
+    global _app_page
+    if _app_page is None:
+        with open(APP_PAGE_PATH, encoding="utf-8") as f:
+            body = f.read()
+        _app_page = (body, _weak_etag(hashlib.sha256(body.encode("utf-8")).hexdigest()))
+    body, etag = _app_page
+    headers = {'ETag': etag, 'Cache-Control': APP_PAGE_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if _etag_matches(_header(event, 'If-None-Match'), etag):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    headers['Content-Type'] = 'text/html; charset=utf-8'
+    return _compress_response(event, {'statusCode': 200, 'headers': headers, 'body': body})
+
+
+# Hardcoded penalty days by repo name; shared with the webhook.
+FORCED_PENALTY_DAYS = homeworks.FORCED_PENALTY_DAYS
+
+# Hardcoded final-grade overrides by github nick.
+FORCED_FINAL_GRADES = {
+    "Denisin": 4.0,
+}
 
-        return js_code + base_html
 
-    body = custom_html_render(df_to_render, detailed=detailed, result_df=result_df, known_homeworks=known_homeworks, hw_to_max_points=hw_to_max_points)
+def _handler(event, context, detailed=False):
 
-    if not detailed and (fio_collisions or orphan_exam_fios):
-        body += "\n<h2>Exam matching warnings</h2>\n"
-        if fio_collisions:
-            body += "<p>FIO collisions (exam result already used by another student, skipped):</p>\n<ul>\n"
-            for sender, key in fio_collisions:
-                body += f"<li>{sender} &rarr; {key}</li>\n"
-            body += "</ul>\n"
-        if orphan_exam_fios:
-            body += "<p>Orphan exam rows (matched no student):</p>\n<ul>\n"
-            for fio_key in orphan_exam_fios:
-                body += f"<li>{fio_key}</li>\n"
-            body += "</ul>\n"
+    params = event.get('queryStringParameters') or {}
+    if params.get('view') == 'app':
+        return _app_page_response(event)
+    as_json = params.get('format') == 'json'
+
+    etag = _grades_etag(event, context, detailed)
+    if etag is not None and _etag_matches(_header(event, 'If-None-Match'), etag):
+        return {
+            'statusCode': 304,
+            'headers': {
+                'ETag': etag,
+                'Cache-Control': GRADES_CACHE_CONTROL,
+                'Vary': 'Accept-Encoding',
+            },
+            'body': '',
+        }
+
+    known_homeworks = homeworks.load_known_homeworks()
+    homework_index = homeworks.HomeworkIndex(known_homeworks.keys())
 
-    if not detailed and no_fio_with_grade:
-        body += "\n<h2>Студенты с оценкой ≥ 4 без заполненного ФИО</h2>\n<ul>\n"
-        for sender in no_fio_with_grade:
-            body += f"<li>{sender}</li>\n"
-        body += "</ul>\n"
+    forced_penalty_days = FORCED_PENALTY_DAYS
 
+    # Reads that don't depend on the events scan run next to it (exam_grades
+    # from here, students info below). Each keeps its own error handling, so
+    # the page is bounded by the slowest read rather than the sum. The detailed
+    # view needs neither.
+    if not detailed:
+        exam_future = _read_executor.submit(_load_exam_sum_by_fio)
+
+    # Best submissions are persisted together with the max event_time they
+    # cover (the watermark); only events from the watermark on are read and
+    # merged in. event_time has day precision, so the watermark day itself is
+    # re-read every time - harmless, since the merge is idempotent.
+    # aggregation=table reads the webhook-maintained best_submissions table
+    # instead, which needs neither the snapshot nor the events.
+    aggregation = params.get('aggregation') or os.getenv('GRADES_AGGREGATION', 'python')
+    term_start, term_end = _term_bounds()
+    snapshot_name = f"best_submissions_{term_start.year}"
+    snapshot_fingerprint = _snapshot_fingerprint(forced_penalty_days)
+    if params.get('snapshot') == 'rebuild' or aggregation == 'table':
+        snapshot_watermark, snapshot_best = None, grading.SubmissionTable()
+    else:
+        snapshot_watermark, snapshot_best = _load_grades_snapshot(snapshot_name, snapshot_fingerprint)
+    since = max(snapshot_watermark or term_start, term_start)
+    print("grades snapshot watermark", snapshot_watermark, "best_submissions", len(snapshot_best))
+
+    # The fio/department of every student already in the snapshot is fetched
+    # next to the events scan.
+    prefetched_senders = {sender for sender, _ in snapshot_best if sender != ''}
     if not detailed:
-        # \\u003c keeps any '<' in a FIO from prematurely closing the script tag.
-        export_json = json.dumps(export_data, ensure_ascii=False).replace('<', '\\u003c')
-        export_html = (
-            '<div style="margin: 20px 0;">'
-            '<button onclick="downloadGradesCsv()">Скачать CSV (ФИО + оценки)</button>'
-            '</div>\n'
-            '<script>\n'
-            f'const GRADES_EXPORT = {export_json};\n'
-            'function csvCell(v){v=String(v==null?"":v);'
-            'return /[",\\r\\n;]/.test(v)?\'"\'+v.replace(/"/g,\'""\')+\'"\':v;}\n'
-            'function downloadGradesCsv(){\n'
-            '  const rows=[["ФИО","Программа","Накоп","Экзамены","Итог"]];\n'
-            '  for(const r of GRADES_EXPORT){rows.push([r.fio,r.dept,r.hw,r.exam,r.final]);}\n'
-            '  const csv=rows.map(row=>row.map(csvCell).join(",")).join("\\r\\n");\n'
-            '  const blob=new Blob(["\\ufeff"+csv],{type:"text/csv;charset=utf-8;"});\n'
-            '  const url=URL.createObjectURL(blob);\n'
-            '  const a=document.createElement("a");a.href=url;a.download="grades.csv";\n'
-            '  document.body.appendChild(a);a.click();document.body.removeChild(a);URL.revokeObjectURL(url);\n'
-            '}\n'
-            '</script>\n'
+        students_future = _read_executor.submit(_load_students_info, sorted(prefetched_senders))
+
+    # (sender, homework) -> best submission so far. Rows are folded in as the
+    # result set parts arrive, so memory tracks students x homeworks rather than
+    # the number of events in the log; a grading.SubmissionTable keeps them
+    # column-wise.
+    best_submissions = snapshot_best.copy()
+
+    def accumulate_events(session):
+        # Called again from scratch on retry, so reset the partial state.
+        best_submissions.clear()
+        best_submissions.update(snapshot_best)
+        events_count = 0
+        changed = False
+        watermark = None
+        with session.execute(EVENTS_QUERY, _events_range_params(since, term_end)) as result_sets:
+            for result_set in result_sets:
+                rows = result_set.rows
+                events_count += len(rows)
+                event_times = [row.event_time for row in rows if row.event_time is not None]
+                if event_times:
+                    part_watermark = _as_datetime(max(event_times))
+                    if watermark is None or part_watermark > watermark:
+                        watermark = part_watermark
+                for submission in grading.parse_events(rows, known_homeworks, homework_index, forced_penalty_days):
+                    changed = grading.merge_best_submission(best_submissions, submission) or changed
+        return events_count, changed, watermark
+
+    if aggregation == 'table':
+        submissions = _load_best_submissions_table(term_start.year)
+        for submission in submissions:
+            grading.merge_best_submission(best_submissions, submission)
+        changed, watermark = False, None
+        print("table best_submissions", len(submissions))
+    elif aggregation == 'yql':
+        submissions, watermark = _load_best_submissions_yql(known_homeworks, forced_penalty_days, since, term_end)
+        changed = False
+        for submission in submissions:
+            changed = grading.merge_best_submission(best_submissions, submission) or changed
+        print("yql new best_submissions", len(submissions))
+    else:
+        events_count, changed, watermark = pool.retry_operation_sync(accumulate_events)
+        print("events_count", events_count, "best_submissions", len(best_submissions))
+    # Memory budget check: the function has 128MB in total.
+    best_nbytes = best_submissions.nbytes()
+    print(f"best_submissions {best_nbytes} bytes, {best_nbytes / max(len(best_submissions), 1):.0f} bytes/submission")
+
+    if watermark is not None and (changed or watermark != snapshot_watermark):
+        _save_grades_snapshot(snapshot_name, snapshot_fingerprint, watermark, best_submissions)
+
+    hw_to_max_points = {s["homework"]: s["max_points"] for s in best_submissions.values()}
+
+    # Hands forced grades
+    for submission in _force_hw_grades():
+        grading.merge_best_submission(best_submissions, submission)
+
+    # Best submissions ordered by (sender, homework), bonuses applied.
+    result_rows = grading.apply_bonuses(best_submissions, _force_hw_bonuses(), known_homeworks)
+
+    if detailed:
+        if as_json:
+            data = grading.detailed_data(result_rows)
+        else:
+            body = grading.render_detailed_page(result_rows)
+    else:
+        all_senders = sorted({row["sender"] for row in result_rows if row["sender"] != ''})
+        senders_fios_dict, senders_dept_dict = students_future.result()
+        # Senders that showed up in this scan weren't part of the prefetch.
+        new_senders = [x for x in all_senders if x not in prefetched_senders]
+        if new_senders:
+            new_fios, new_depts = _load_students_info(new_senders)
+            senders_fios_dict.update(new_fios)
+            senders_dept_dict.update(new_depts)
+        print("senders_fios_dict", senders_fios_dict)
+
+        summary = grading.build_summary(
+            result_rows,
+            senders_fios_dict,
+            senders_dept_dict,
+            exam_future.result(),
+            known_homeworks,
+            FORCED_FINAL_GRADES,
         )
-        body = export_html + body
+        print("exam fio_collisions", summary["fio_collisions"])
+        print("exam orphan_exam_fios", summary["orphan_exam_fios"])
+        if as_json:
+            data = grading.summary_data(summary, result_rows, known_homeworks, hw_to_max_points)
+        else:
+            body = grading.render_summary_page(summary, result_rows, known_homeworks, hw_to_max_points)
+
+    if as_json:
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        content_type = 'application/json; charset=utf-8'
+    else:
+        content_type = 'text/html; charset=utf-8'
+    headers = {
+        'Content-Type': content_type,
+    }
+    if etag is not None:
+        headers['ETag'] = etag
+        headers['Cache-Control'] = GRADES_CACHE_CONTROL
 
-    return {
+    return _compress_response(event, {
         'statusCode': 200,
-        'headers': {
-            'Content-Type': 'text/html; charset=utf-8',
-        },
+        'headers': headers,
         'body': body,
-    }
+    })
 
 
 def handler_summary(event, context):
@@ -672,90 +890,384 @@ def handler_detailed(event, context):
     return _handler(event, context, detailed=True)
 
 
-VALID_DEPARTMENTS = {"ФТиАД", "ЭАД", "ФЭН", "ИПИИ", "-"}
+# One student's events, read through the student_login index (ydb/003): a
+# lookup by the login the webhook parsed from the repo name instead of a scan
+# of the log. The nicks go in one List<Utf8> parameter, so the text is the same
+# for every call. Rows logged while their repo matched no known homework have
+# no student_login until reparse-events fills it in.
+STUDENT_EVENTS_QUERY = '''
+    DECLARE $student_logins AS List<Utf8>;
+    DECLARE $since AS Date;
+    DECLARE $until AS Date;
+
+    SELECT sender, repo_name, completed_at_str, check_run_summary, event_time,
+        homework, student_login, points, max_points, completed_at
+    FROM github_events_log_v3 VIEW idx_student_login
+    WHERE student_login IN $student_logins
+        AND event_time >= $since
+        AND event_time < $until
+        AND check_run_summary != "";
+'''
+
+
+def _load_student_events(github_nicks):
+    """Event rows of the nicks' repos; raises on a failed read."""
+    params = {
+        '$student_logins': (list(github_nicks), ydb.ListType(ydb.PrimitiveType.Utf8)),
+        **_events_range_params(*_term_bounds()),
+    }
+    result_sets = pool.execute_with_retries(STUDENT_EVENTS_QUERY, params)
+    return [row for result_set in result_sets for row in result_set.rows]
 
 
-def save_user_info(event, context):
+STUDENT_EXAM_QUERY = '''
+    DECLARE $fio AS Utf8;
+    SELECT exam_sum FROM exam_grades WHERE fio = $fio;
+'''
 
-    params = event['queryStringParameters'] or {}
+# fio_key is the normalized FIO (ydb/006), so namesakes are a lookup of the
+# fio_key index rather than a scan of the table.
+FIO_NAMESAKES_QUERY = '''
+    DECLARE $fio_key AS Utf8;
+    DECLARE $github_nick AS Utf8;
+    SELECT github_nick, fio FROM github_nick_to_fio VIEW idx_fio_key
+    WHERE fio_key = $fio_key AND github_nick < $github_nick;
+'''
+
+
+def _fio_namesakes(github_nick, fio_key):
+    """Nicks sorted before github_nick whose FIO normalizes to fio_key.
+
+    build_summary gives an exam row to the first such student with
+    submissions, so these can take github_nick's exam grade. Their FIOs are
+    returned too; a failed read returns no namesakes.
+    """
+    namesakes = {}
+    try:
+        params = {'$fio_key': fio_key, '$github_nick': github_nick}
+        for row in pool.execute_with_retries(FIO_NAMESAKES_QUERY, params)[0].rows:
+            namesakes[_col_str(row.github_nick)] = _col_str(row.fio)
+    except Exception as e:
+        print(f"cant load fio namesakes error: {e}")
+    return namesakes
 
-    github_nick = params.get('github_nick')
-    fio = params.get('fio')
-    department = params.get('department')
 
+def handler_student(event, context):
+    """One student's grade breakdown as JSON: ?github_nick=<login>.
+
+    Best submission per homework with penalties and bonuses, homework, exam and
+    final grades - computed from the student's own rows only.
+    """
+    params = event.get('queryStringParameters') or {}
+    github_nick = params.get('github_nick')
     if not github_nick:
         return {'statusCode': 400, 'body': 'github_nick is required'}
 
-    if fio is None and department is None:
-        return {'statusCode': 400, 'body': 'nothing to update: provide fio and/or department'}
-
-    if department is not None and department not in VALID_DEPARTMENTS:
-        return {'statusCode': 400, 'body': f'invalid department: {department}'}
-
-    # fio is a NOT NULL column, so a partial UPSERT that omits it is rejected
-    # ("All not null columns should be initialized"). Read the existing row,
-    # merge the changed field, and write all columns so the untouched sibling
-    # (fio or department) is preserved instead of clobbered.
-    existing_fio = ''
-    existing_department = ''
-    read_ok = True
+    known_homeworks = homeworks.load_known_homeworks()
+    homework_index = homeworks.HomeworkIndex(known_homeworks.keys())
+
+    students_future = _read_executor.submit(_load_students_info, [github_nick])
     try:
-        existing = pool.execute_with_retries('''
-            DECLARE $github_nick as UTF8;
-            SELECT fio, department FROM github_nick_to_fio WHERE github_nick = $github_nick;
-        ''', {'$github_nick': github_nick})
-        rows = existing[0].rows
-        if rows:
-            existing_fio = _col_str(rows[0].fio) or ''
-            existing_department = _col_str(rows[0].department) or ''
+        rows = _load_student_events([github_nick])
     except Exception as e:
-        read_ok = False
-        print(f"save_user_info read existing failed: {e}")
+        print(f"handler_student events error: {e}")
+        return {'statusCode': 500, 'body': f'cant load events: {e}'}
+    print("handler_student", github_nick, "events", len(rows))
 
-    # A partial update relies on the existing value of the other column; if the
-    # read failed, abort rather than risk overwriting it with an empty string.
-    if (fio is None or department is None) and not read_ok:
-        return {'statusCode': 500, 'body': 'could not read existing row; aborting to avoid clobbering'}
+    fios, depts = students_future.result()
+    fio = fios.get(github_nick)
+    exam_sum_by_fio = {}
+    fio_key = grading.normalize_fio(fio)
+    if fio_key:
+        try:
+            exam_rows = pool.execute_with_retries(STUDENT_EXAM_QUERY, {'$fio': fio_key})[0].rows
+            if exam_rows and exam_rows[0].exam_sum is not None:
+                exam_sum_by_fio[fio_key] = float(exam_rows[0].exam_sum)
+        except Exception as e:
+            print(f"cant load exam grade error: {e}")
+
+    # Same exam row rule as the summary page: students sharing the FIO who sort
+    # first and have submissions take it, so their rows go into build_summary too.
+    github_nicks = {github_nick}
+    if exam_sum_by_fio:
+        namesakes = _fio_namesakes(github_nick, fio_key)
+        if namesakes:
+            try:
+                rows += _load_student_events(namesakes)
+            except Exception as e:
+                print(f"handler_student namesakes events error: {e}")
+            github_nicks.update(namesakes)
+            fios.update(namesakes)
+
+    best_submissions = {}
+    for submission in grading.parse_events(rows, known_homeworks, homework_index, FORCED_PENALTY_DAYS):
+        if submission["sender"] in github_nicks:
+            grading.merge_best_submission(best_submissions, submission)
+    for submission in _force_hw_grades():
+        if submission["sender"] in github_nicks:
+            grading.merge_best_submission(best_submissions, submission)
+    bonuses = [bonus for bonus in _force_hw_bonuses() if bonus["sender"] in github_nicks]
+    all_result_rows = grading.apply_bonuses(best_submissions, bonuses, known_homeworks)
+    result_rows = [row for row in all_result_rows if row["sender"] == github_nick]
+    bonuses = [bonus for bonus in bonuses if bonus["sender"] == github_nick]
+
+    summary = grading.build_summary(all_result_rows, fios, depts, exam_sum_by_fio, known_homeworks, FORCED_FINAL_GRADES)
+    student = next((row for row in summary["students"] if row["sender"] == github_nick), None)
+    if student is None:
+        # No submissions yet: only the exam counts, unless a namesake with
+        # submissions took the exam row.
+        exam_sum = 0.0 if summary["students"] else exam_sum_by_fio.get(fio_key, 0.0)
+        exam_hse_grade = grading.exam_grade(exam_sum)
+        final_hse_grade = grading.final_grade(github_nick, 0, exam_hse_grade, FORCED_FINAL_GRADES)
+        student = {
+            "sender": github_nick,
+            "result_points": 0.0,
+            "fio": fio,
+            "department": depts.get(github_nick),
+            "hw_hse_grade": "0.00",
+            "hw_hse_grade_rounded": 0,
+            "exam_hse_grade": f"{exam_hse_grade:.2f}",
+            "final_hse_grade": f"{final_hse_grade:.2f}",
+        }
+    body = json.dumps(
+        grading.student_data(student, result_rows, bonuses),
+        ensure_ascii=False, separators=(',', ':'),
+    )
+    return _compress_response(event, {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json; charset=utf-8', 'Cache-Control': GRADES_CACHE_CONTROL},
+        'body': body,
+    })
+
+
+VALID_DEPARTMENTS = {"ФТиАД", "ЭАД", "ФЭН", "ИПИИ", "-"}
+
+
+# Merges each update into the existing row in a single statement: fio is NOT
+# NULL, so a partial UPSERT that omits it is rejected ("All not null columns
+# should be initialized"), and a NULL field of an update keeps the current
+# value instead of clobbering it. The whole batch is one transaction.
+#
+# The first result set returns the merged rows, with the exam row matched by
+# the new FIO (exam_fio, normalized by the caller) when the FIO changed, read
+# before the writes. exam_fio is also the row's new fio_key (ydb/006).
+MERGE_USERS_INFO_QUERY = '''
+    DECLARE $updates AS List<Struct<github_nick: Utf8, fio: Utf8?, department: Utf8?, exam_fio: Utf8?>>;
+
+    $merged = SELECT
+        u.github_nick AS github_nick,
+        COALESCE(u.fio, t.fio, "") AS fio,
+        COALESCE(u.department, t.department, "") AS department,
+        COALESCE(u.exam_fio, t.fio_key) AS fio_key,
+        u.exam_fio AS exam_fio
+    FROM AS_TABLE($updates) AS u
+    LEFT JOIN github_nick_to_fio AS t ON t.github_nick = u.github_nick;
+
+    SELECT m.github_nick AS github_nick, m.fio AS fio, m.department AS department,
+        m.exam_fio IS NOT NULL AS fio_changed, e.exam_sum AS exam_sum
+    FROM $merged AS m
+    LEFT JOIN exam_grades AS e ON e.fio = m.exam_fio;
+
+    UPSERT INTO github_nick_to_fio (github_nick, fio, department, fio_key, created)
+    SELECT github_nick, fio, department, fio_key, CurrentUtcDate() AS created FROM $merged;
+
+    UPSERT INTO grades_versions (name, changed_at)
+    VALUES ("github_nick_to_fio", CurrentUtcTimestamp());
+'''
+
+USERS_INFO_UPDATES_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('github_nick', ydb.PrimitiveType.Utf8)
+    .add_member('fio', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('department', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('exam_fio', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+)
+
+MAX_USERS_INFO_UPDATES = 1000
 
-    final_fio = fio if fio is not None else existing_fio
-    final_department = department if department is not None else existing_department
+
+def _users_info_update(github_nick, fio, department):
+    """Validate one (github_nick, fio?, department?) update; returns (update, error)."""
+    if not github_nick or not isinstance(github_nick, str):
+        return None, 'github_nick is required'
+    if fio is None and department is None:
+        return None, 'nothing to update: provide fio and/or department'
+    if fio is not None and not isinstance(fio, str):
+        return None, 'fio must be a string'
+    if department is not None and (not isinstance(department, str) or department not in VALID_DEPARTMENTS):
+        return None, f'invalid department: {department}'
     # '-' is the "unset" sentinel, stored as empty string (rendered as '-').
-    if final_department == '-':
-        final_department = ''
+    if department == '-':
+        department = ''
+    exam_fio = grading.normalize_fio(fio) if fio is not None else None
+    return {'github_nick': github_nick, 'fio': fio, 'department': department, 'exam_fio': exam_fio}, None
 
-    try:
-        pool.execute_with_retries('''
-            DECLARE $github_nick as UTF8;
-            DECLARE $fio as UTF8;
-            DECLARE $department as UTF8;
 
-            UPSERT INTO github_nick_to_fio (github_nick, fio, department, created)
-            VALUES ($github_nick, $fio, $department, CurrentUtcDate());
-        ''', {
-            '$github_nick': github_nick,
-            '$fio': final_fio,
-            '$department': final_department,
-        })
+def _merge_users_info(updates):
+    """Apply validated updates in one round trip. Later updates of a nick win per field.
+
+    Returns the stored rows: github_nick, fio, department ('-' when unset) and,
+    for rows whose FIO changed, exam_sum of the exam row matched by the new FIO
+    (None if there is none).
+    """
+    merged = {}
+    for update in updates:
+        current = merged.setdefault(update['github_nick'], dict(update))
+        if update['fio'] is not None:
+            current['fio'] = update['fio']
+            current['exam_fio'] = update['exam_fio']
+        if update['department'] is not None:
+            current['department'] = update['department']
+    result_sets = pool.execute_with_retries(
+        MERGE_USERS_INFO_QUERY, {'$updates': (list(merged.values()), USERS_INFO_UPDATES_TYPE)})
+    saved_rows = []
+    for row in result_sets[0].rows:
+        saved_row = {
+            'github_nick': _col_str(row.github_nick),
+            'fio': _col_str(row.fio) or '',
+            'department': _col_str(row.department) or '-',
+        }
+        if row.fio_changed:
+            saved_row['exam_sum'] = row.exam_sum
+        saved_rows.append(saved_row)
+    return saved_rows
+
+
+def _json_body(event):
+    """Parsed JSON request body (the gateway may pass it base64-encoded); raises ValueError."""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded') and body:
+        body = base64.b64decode(body).decode('utf-8')
+    return json.loads(body) if body else {}
+
+
+def save_user_info(event, context):
+
+    params = event['queryStringParameters'] or {}
+
+    update, error = _users_info_update(params.get('github_nick'), params.get('fio'), params.get('department'))
+    if error:
+        return {'statusCode': 400, 'body': error}
+
+    # Optional: the homework grade the page shows for this student. With it the
+    # response carries the final grade recomputed against the new exam match,
+    # so the page can patch the row without re-running the whole aggregation.
+    hw_hse_grade_rounded = None
+    if params.get('hw_hse_grade_rounded') not in (None, ''):
+        try:
+            hw_hse_grade_rounded = int(params['hw_hse_grade_rounded'])
+        except ValueError:
+            return {'statusCode': 400, 'body': 'hw_hse_grade_rounded must be an integer'}
+
+    try:
+        saved_rows = _merge_users_info([update])
     except Exception as e:
         # Surface the real YDB error instead of a generic 500 with no message.
         print(f"save_user_info failed: {e}")
         return {'statusCode': 500, 'body': f'save failed: {e}'}
 
+    # The updated row; exam_hse_grade/final_hse_grade only when the FIO (and so
+    # the exam match) changed. An exam row that another student already matches
+    # is only caught as a collision by the next full render.
+    saved_row = saved_rows[0] if saved_rows else {'github_nick': update['github_nick']}
+    if 'exam_sum' in saved_row:
+        exam_hse_grade = grading.exam_grade(saved_row.pop('exam_sum'))
+        saved_row['exam_hse_grade'] = f"{exam_hse_grade:.2f}"
+        if hw_hse_grade_rounded is not None:
+            final_hse_grade = grading.final_grade(
+                update['github_nick'], hw_hse_grade_rounded, exam_hse_grade, FORCED_FINAL_GRADES)
+            saved_row['final_hse_grade'] = f"{final_hse_grade:.2f}"
+
     return {
         'statusCode': 200,
-        'body': 'OK',
+        'headers': {'Content-Type': 'application/json; charset=utf-8'},
+        'body': json.dumps(saved_row, ensure_ascii=False),
     }
 
 
+def save_user_info_batch(event, context):
+    """Apply many FIO/department edits at once from a POST.
+
+    Body: {"updates": [{"github_nick": ..., "fio": ..., "department": ...}, ...]}
+    with fio and department each optional. Either every update is applied (in
+    one transaction) or none is: an invalid update fails the whole batch with
+    400 and the offending indexes.
+    """
+    try:
+        payload = _json_body(event)
+    except Exception:
+        return {'statusCode': 400, 'body': 'invalid json body'}
+
+    raw_updates = payload.get('updates') if isinstance(payload, dict) else None
+    if not isinstance(raw_updates, list):
+        return {'statusCode': 400, 'body': 'updates must be a list'}
+    if len(raw_updates) > MAX_USERS_INFO_UPDATES:
+        return {'statusCode': 400, 'body': f'too many updates: at most {MAX_USERS_INFO_UPDATES} per request'}
+
+    updates = []
+    errors = []
+    for i, raw in enumerate(raw_updates):
+        if not isinstance(raw, dict):
+            errors.append({'index': i, 'error': 'update must be an object'})
+            continue
+        update, error = _users_info_update(raw.get('github_nick'), raw.get('fio'), raw.get('department'))
+        if error:
+            errors.append({'index': i, 'error': error})
+        else:
+            updates.append(update)
+    if errors:
+        return {'statusCode': 400, 'body': json.dumps({'errors': errors}, ensure_ascii=False)}
+    if not updates:
+        return {'statusCode': 200, 'body': json.dumps({'written': 0})}
+
+    try:
+        saved_rows = _merge_users_info(updates)
+    except Exception as e:
+        print(f"save_user_info_batch failed: {e}")
+        return {'statusCode': 500, 'body': f'save failed: {e}'}
+
+    for saved_row in saved_rows:
+        saved_row.pop('exam_sum', None)
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json; charset=utf-8'},
+        'body': json.dumps({'written': len(saved_rows), 'rows': saved_rows}, ensure_ascii=False),
+    }
+
+
+# The whole upload is one query, i.e. one serializable transaction: readers see
+# either the previous exam_grades or the new one, never a half-written table.
+# Rows missing from the upload are deleted first (the DELETE reads the table, and
+# YDB wants a transaction's reads before its writes), then the upload is upserted.
+REPLACE_EXAM_GRADES_QUERY = '''
+    DECLARE $rows AS List<Struct<fio: Utf8, exam_sum: Double>>;
+
+    $fios = ListMap($rows, ($row) -> ($row.fio));
+
+    DELETE FROM exam_grades ON
+    SELECT fio FROM exam_grades WHERE fio NOT IN $fios;
+
+    UPSERT INTO exam_grades (fio, exam_sum)
+    SELECT fio, exam_sum FROM AS_TABLE($rows);
+
+    UPSERT INTO grades_versions (name, changed_at)
+    VALUES ("exam_grades", CurrentUtcTimestamp());
+'''
+
+EXAM_GRADES_ROWS_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('fio', ydb.PrimitiveType.Utf8)
+    .add_member('exam_sum', ydb.PrimitiveType.Double)
+)
+
+
 def save_exam_grades(event, context):
-    """Truncate + replace the exam_grades table from a token-authenticated POST.
+    """Atomically replace the exam_grades table from a token-authenticated POST.
 
     The bot (no direct YDB access) normalizes FIOs and POSTs
     {"rows": [{"fio": <normalized>, "exam_sum": <float>}, ...]} with the shared
     secret token as the `token` query param.
     """
-    import base64
-
     expected_token = os.getenv('EXAM_GRADES_SECRET_TOKEN')
     params = event.get('queryStringParameters') or {}
     token = params.get('token')
@@ -763,44 +1275,227 @@ def save_exam_grades(event, context):
     if not expected_token or token != expected_token:
         return {'statusCode': 401, 'body': 'unauthorized'}
 
-    body = event.get('body') or ''
-    if event.get('isBase64Encoded') and body:
-        body = base64.b64decode(body).decode('utf-8')
-
     try:
-        payload = json.loads(body) if body else {}
+        payload = _json_body(event)
     except Exception:
         return {'statusCode': 400, 'body': 'invalid json body'}
 
-    rows = payload.get('rows')
+    rows = payload.get('rows') if isinstance(payload, dict) else None
     if not isinstance(rows, list):
         return {'statusCode': 400, 'body': 'rows must be a list'}
 
-    clean_rows = []
+    # Keyed by fio: a repeated fio keeps its last exam_sum, as the per-row
+    # UPSERTs used to.
+    clean_rows = {}
     for r in rows:
         if not isinstance(r, dict):
             continue
-        fio = normalize_fio(r.get('fio'))
+        fio = grading.normalize_fio(r.get('fio'))
         if not fio:
             continue
         try:
             exam_sum = float(r.get('exam_sum'))
         except (TypeError, ValueError):
             continue
-        clean_rows.append((fio, exam_sum))
-
-    # Truncate then replace: every upload fully supersedes the previous one.
-    pool.execute_with_retries('DELETE FROM exam_grades;')
-    for fio, exam_sum in clean_rows:
-        pool.execute_with_retries('''
-            DECLARE $fio as UTF8;
-            DECLARE $exam_sum as Double;
+        clean_rows[fio] = exam_sum
 
-            UPSERT INTO exam_grades (fio, exam_sum)
-            VALUES ($fio, $exam_sum);
-        ''', {'$fio': fio, '$exam_sum': exam_sum})
+    # Replace: every upload fully supersedes the previous one, in one round trip.
+    rows_param = [{'fio': fio, 'exam_sum': exam_sum} for fio, exam_sum in clean_rows.items()]
+    pool.execute_with_retries(REPLACE_EXAM_GRADES_QUERY, {'$rows': (rows_param, EXAM_GRADES_ROWS_TYPE)})
 
     return {
         'statusCode': 200,
         'body': json.dumps({'written': len(clean_rows)}),
     }
+
+
+V2_EVENTS_QUERY = '''
+    SELECT event_time, sender, repo_name, check_run_summary, completed_at_str, event_data
+    FROM github_events_log_v2;
+'''
+
+# One batch of the v2 history. A key the webhook has already written keeps
+# its rows: the new ones are picked (a read) before the writes.
+BACKFILL_EVENTS_QUERY = '''
+    DECLARE $events AS List<Struct<
+        check_run_id: Uint64, action: Utf8, event_time: Date?, sender: Utf8?, repo_name: Utf8?,
+        check_run_summary: Utf8?, completed_at_str: Utf8?, homework: Utf8?, student_login: Utf8?,
+        points: Int32?, max_points: Int32?, completed_at: Timestamp?, payload: String>>;
+
+    $new = SELECT e.* FROM AS_TABLE($events) AS e
+    LEFT ONLY JOIN github_events_log_v3 AS l ON l.check_run_id = e.check_run_id AND l.action = e.action;
+
+    UPSERT INTO github_events_log_v3
+    SELECT check_run_id, action, event_time, sender, repo_name, check_run_summary, completed_at_str,
+        homework, student_login, points, max_points, completed_at
+    FROM $new;
+
+    UPSERT INTO github_event_payloads (check_run_id, action, encoding, payload, received_at)
+    SELECT check_run_id, action, "gzip" AS encoding, payload,
+        COALESCE(CAST(event_time AS Timestamp), CurrentUtcTimestamp()) AS received_at
+    FROM $new;
+
+    UPSERT INTO grades_versions (name, changed_at)
+    VALUES ("github_events_log_v3", CurrentUtcTimestamp());
+'''
+
+BACKFILL_EVENTS_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('check_run_id', ydb.PrimitiveType.Uint64)
+    .add_member('action', ydb.PrimitiveType.Utf8)
+    .add_member('event_time', ydb.OptionalType(ydb.PrimitiveType.Date))
+    .add_member('sender', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('repo_name', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('check_run_summary', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('completed_at_str', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('homework', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('student_login', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    .add_member('points', ydb.OptionalType(ydb.PrimitiveType.Int32))
+    .add_member('max_points', ydb.OptionalType(ydb.PrimitiveType.Int32))
+    .add_member('completed_at', ydb.OptionalType(ydb.PrimitiveType.Timestamp))
+    .add_member('payload', ydb.PrimitiveType.String)
+)
+
+BACKFILL_BATCH_ROWS = 500
+
+
+def _v3_event(row, homework_index):
+    """A github_events_log_v2 row as a BACKFILL_EVENTS_QUERY event, or None if it isn't a completed check run."""
+    event_data = _col_str(row.event_data)
+    try:
+        payload = json.loads(event_data) if event_data else {}
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or payload.get('action') != 'completed':
+        return None
+    check_run = payload.get('check_run')
+    if not isinstance(check_run, dict) or check_run.get('id') is None:
+        return None
+    repo_name = _col_str(row.repo_name)
+    check_run_summary = _col_str(row.check_run_summary)
+    completed_at_str = _col_str(row.completed_at_str)
+    event_time = row.event_time
+    if isinstance(event_time, datetime.datetime):
+        event_time = event_time.date()
+    return {
+        'check_run_id': int(check_run['id']),
+        'action': 'completed',
+        'event_time': event_time,
+        'sender': _col_str(row.sender),
+        'repo_name': repo_name,
+        'check_run_summary': check_run_summary,
+        'completed_at_str': completed_at_str,
+        **homeworks.parse_check_run(homework_index, repo_name, check_run_summary, completed_at_str),
+        'payload': gzip.compress(event_data.encode('utf-8'), mtime=0),
+    }
+
+
+def backfill_events_log():
+    """Copy github_events_log_v2 into github_events_log_v3 and github_event_payloads.
+
+    Streams the old log and writes BACKFILL_BATCH_ROWS events per query, so no
+    statement spans the whole history. Only completed check runs are copied,
+    one row per (check_run_id, action) - the first one read. The typed columns
+    are parsed with the current hw-meta.json, also for rows v2 stored without
+    them. Safe to re-run; run rebuild-best-submissions afterwards. Returns the
+    number of check runs found.
+    """
+    homework_index = homeworks.load_homework_index()
+    copied = 0
+
+    def write(batch):
+        nonlocal copied
+        pool.execute_with_retries(BACKFILL_EVENTS_QUERY, {'$events': (list(batch.values()), BACKFILL_EVENTS_TYPE)})
+        copied += len(batch)
+        batch.clear()
+
+    def scan(session):
+        # Called again from scratch on retry; the batches already written are
+        # left alone the second time.
+        nonlocal copied
+        copied = 0
+        batch = {}
+        with session.execute(V2_EVENTS_QUERY) as result_sets:
+            for result_set in result_sets:
+                for row in result_set.rows:
+                    event = _v3_event(row, homework_index)
+                    if event is not None:
+                        batch.setdefault((event['check_run_id'], event['action']), event)
+                    if len(batch) >= BACKFILL_BATCH_ROWS:
+                        write(batch)
+        if batch:
+            write(batch)
+
+    pool.retry_operation_sync(scan)
+    return copied
+
+
+# Sets the fio_key of rows written before ydb/006; see fill_fio_keys.
+FILL_FIO_KEYS_QUERY = '''
+    DECLARE $rows AS List<Struct<github_nick: Utf8, fio_key: Utf8>>;
+    UPDATE github_nick_to_fio ON SELECT * FROM AS_TABLE($rows);
+'''
+
+FIO_KEYS_ROWS_TYPE = ydb.ListType(
+    ydb.StructType()
+    .add_member('github_nick', ydb.PrimitiveType.Utf8)
+    .add_member('fio_key', ydb.PrimitiveType.Utf8)
+)
+
+
+def fill_fio_keys():
+    """Set fio_key on the github_nick_to_fio rows that have none; returns how many.
+
+    save_user_info writes fio_key with every FIO, so this is only needed once,
+    after ydb/006 adds the column to the existing rows.
+    """
+    rows = []
+
+    def scan(session):
+        # Called again from scratch on retry.
+        rows.clear()
+        with session.execute('SELECT github_nick, fio FROM github_nick_to_fio WHERE fio_key IS NULL') as result_sets:
+            for result_set in result_sets:
+                for row in result_set.rows:
+                    rows.append({
+                        'github_nick': _col_str(row.github_nick),
+                        'fio_key': grading.normalize_fio(_col_str(row.fio)),
+                    })
+
+    pool.retry_operation_sync(scan)
+    if rows:
+        pool.execute_with_retries(FILL_FIO_KEYS_QUERY, {'$rows': (rows, FIO_KEYS_ROWS_TYPE)})
+    return len(rows)
+
+
+def main():
+    """Maintenance commands, run locally against the database in YDB_ENDPOINT/YDB_DATABASE."""
+    global pool
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebuild = commands.add_parser(
+        'rebuild-best-submissions', help='regenerate a term of the best_submissions table from the events log')
+    rebuild.add_argument('--year', type=int, default=_term_bounds()[0].year)
+    reparse = commands.add_parser(
+        'reparse-events', help='parse the events of a term logged before their homework was in hw-meta.json')
+    reparse.add_argument('--year', type=int, default=_term_bounds()[0].year)
+    commands.add_parser('backfill-events-log', help='copy github_events_log_v2 into github_events_log_v3')
+    commands.add_parser('fill-fio-keys', help='set fio_key on github_nick_to_fio rows written before it existed')
+    args = parser.parse_args()
+
+    # Credentials from the environment (YDB_ACCESS_TOKEN_CREDENTIALS, ...)
+    # rather than the function's metadata service.
+    pool = ydb_pool.LazyPool(credentials_factory=ydb.credentials_from_env_variables)
+    if args.command == 'rebuild-best-submissions':
+        written = rebuild_best_submissions(args.year)
+        print(f"best_submissions {args.year}: {written} rows")
+    elif args.command == 'reparse-events':
+        print(f"github_events_log_v3 {args.year}: {reparse_events(args.year)} events reparsed")
+    elif args.command == 'backfill-events-log':
+        print(f"github_events_log_v3: {backfill_events_log()} check runs backfilled")
+    elif args.command == 'fill-fio-keys':
+        print(f"github_nick_to_fio: {fill_fio_keys()} fio keys set")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Lazily created YDB driver + query session pool, reused across warm invocations.
+
+Importing the module doesn't touch the network. The driver is built on the
+first query and kept for the lifetime of the instance; a driver that has been
+idle for a while is health-checked before reuse, and one that fails with a
+transport error is rebuilt transparently and the call retried once. Connect
+time and per-call query time are logged separately.
+"""
+import os
+import threading
+import time
+
+import ydb
+import ydb.iam
+
+# Errors after which the driver is assumed broken and rebuilt.
+_CONNECTION_ERRORS = (
+    ydb.issues.ConnectionError,
+    ydb.issues.SessionPoolClosed,
+    ydb.issues.Unavailable,
+)
+
+# A driver idle for longer than this is checked with driver.wait() before use.
+HEALTH_CHECK_AFTER_S = 60
+
+
+class LazyPool:
+    """Stands in for ydb.QuerySessionPool; any pool method can be called on it."""
+
+    def __init__(self, endpoint=None, database=None, credentials_factory=None, connect_timeout=5):
+        self._endpoint = endpoint
+        self._database = database
+        self._credentials_factory = credentials_factory or ydb.iam.MetadataUrlCredentials
+        self._connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._driver = None
+        self._pool = None
+        self._last_used = 0.0
+        # Instrumentation: how many times and how long the driver took to connect.
+        self.connects = 0
+        self.connect_seconds = 0.0
+
+    def _connect(self):
+        started = time.perf_counter()
+        driver = ydb.Driver(
+            endpoint=self._endpoint or os.getenv('YDB_ENDPOINT'),
+            database=self._database or os.getenv('YDB_DATABASE'),
+            credentials=self._credentials_factory(),
+        )
+        try:
+            driver.wait(fail_fast=True, timeout=self._connect_timeout)
+        except Exception:
+            driver.stop()
+            raise
+        self._driver = driver
+        self._pool = ydb.QuerySessionPool(driver)
+        elapsed = time.perf_counter() - started
+        self.connects += 1
+        self.connect_seconds += elapsed
+        print(f"ydb connect #{self.connects} took {elapsed:.3f}s")
+
+    def _reset(self):
+        pool, driver = self._pool, self._driver
+        self._pool = self._driver = None
+        try:
+            if pool is not None:
+                pool.stop()
+            if driver is not None:
+                driver.stop()
+        except Exception as e:
+            print(f"ydb driver stop error: {e}")
+
+    def get(self):
+        """Return a live ydb.QuerySessionPool, connecting or reconnecting if needed."""
+        with self._lock:
+            if self._pool is not None and time.monotonic() - self._last_used > HEALTH_CHECK_AFTER_S:
+                try:
+                    self._driver.wait(fail_fast=True, timeout=self._connect_timeout)
+                except Exception as e:
+                    print(f"ydb health check failed, reconnecting: {e}")
+                    self._reset()
+            if self._pool is None:
+                self._connect()
+            self._last_used = time.monotonic()
+            return self._pool
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            for attempt in range(2):
+                pool = self.get()
+                started = time.perf_counter()
+                try:
+                    return getattr(pool, name)(*args, **kwargs)
+                except _CONNECTION_ERRORS as e:
+                    if attempt:
+                        raise
+                    print(f"ydb {name} connection error, rebuilding driver: {e}")
+                    with self._lock:
+                        if self._pool is pool:
+                            self._reset()
+                finally:
+                    print(f"ydb {name} took {time.perf_counter() - started:.3f}s")
+
+        return call
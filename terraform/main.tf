@@ -88,7 +88,7 @@ resource "yandex_function" "stop-compute-tf" {
 resource "yandex_function" "homeworks-info-tf" {
     name               = "homeworks-info-tf"
     description        = "Get HTML summary grades table"
-    user_hash          = "v0.0.88"
+    user_hash          = "v0.0.89"
     runtime            = "python314"
     entrypoint         = "index.handler_summary"
     memory             = "128"
@@ -106,7 +106,7 @@ resource "yandex_function" "homeworks-info-tf" {
 resource "yandex_function" "homeworks-info-detailed-tf" {
     name               = "homeworks-info-detailed-tf"
     description        = "Get HTML detailed grades table"
-    user_hash          = "v0.0.88"
+    user_hash          = "v0.0.89"
     runtime            = "python314"
     entrypoint         = "index.handler_detailed"
     memory             = "128"
@@ -121,10 +121,28 @@ resource "yandex_function" "homeworks-info-detailed-tf" {
     }
 }
 
+resource "yandex_function" "homeworks-info-student-tf" {
+    name               = "homeworks-info-student-tf"
+    description        = "Get one student's grade breakdown as JSON"
+    user_hash          = "v0.0.89"
+    runtime            = "python314"
+    entrypoint         = "index.handler_student"
+    memory             = "128"
+    execution_timeout  = "60"
+    service_account_id = "ajeg6pgmfcbnqvosbefc"
+    environment = {
+        YDB_DATABASE = "/ru-central1/b1gdun28gk5uj1a2cirj/etnis546o87uog4k54km"
+        YDB_ENDPOINT = "grpcs://ydb.serverless.yandexcloud.net:2135"
+    }
+    content {
+        zip_filename = "functions/grades.zip"
+    }
+}
+
 resource "yandex_function" "homeworks-info-save-fio-tf" {
     name               = "homeworks-info-save-fio-tf"
     description        = "Save FIO to ydb"
-    user_hash          = "v0.0.88"
+    user_hash          = "v0.0.89"
     runtime            = "python314"
     entrypoint         = "index.save_user_info"
     memory             = "128"
@@ -140,10 +158,29 @@ resource "yandex_function" "homeworks-info-save-fio-tf" {
 }
 
 
+resource "yandex_function" "homeworks-info-save-fio-batch-tf" {
+    name               = "homeworks-info-save-fio-batch-tf"
+    description        = "Save many FIO/department edits to ydb in one transaction"
+    user_hash          = "v0.0.89"
+    runtime            = "python314"
+    entrypoint         = "index.save_user_info_batch"
+    memory             = "128"
+    execution_timeout  = "60"
+    service_account_id = "ajeg6pgmfcbnqvosbefc"
+    environment = {
+        YDB_DATABASE = "/ru-central1/b1gdun28gk5uj1a2cirj/etnis546o87uog4k54km"
+        YDB_ENDPOINT = "grpcs://ydb.serverless.yandexcloud.net:2135"
+    }
+    content {
+        zip_filename = "functions/grades.zip"
+    }
+}
+
+
 resource "yandex_function" "homeworks-info-save-exam-grades-tf" {
     name               = "homeworks-info-save-exam-grades-tf"
-    description        = "Truncate + replace exam_grades in ydb (token-authed; called by the bot)"
-    user_hash          = "v0.0.86"
+    description        = "Atomically replace exam_grades in ydb (token-authed; called by the bot)"
+    user_hash          = "v0.0.89"
     runtime            = "python314"
     entrypoint         = "index.save_exam_grades"
     memory             = "128"
@@ -170,7 +207,7 @@ resource "yandex_function" "homeworks-info-save-exam-grades-tf" {
 resource "yandex_function" "handle-github-hook-tf" {
     name               = "handle-github-hook-tf"
     description        = "Save github hook data to YDB"
-    user_hash          = "v0.0.5"
+    user_hash          = "v0.0.14"
     runtime            = "python314"
     entrypoint         = "index.handler"
     memory             = "128"
@@ -0,0 +1,12 @@
+-- Persisted best-submission state of the grades function (see
+-- _load_grades_snapshot in functions/grades/index.py). One row per snapshot
+-- name, e.g. "best_submissions_2026"; `watermark` is the max event_time of
+-- github_events_log_v3 folded into `best_submissions`.
+CREATE TABLE grades_snapshot (
+    name Utf8 NOT NULL,
+    fingerprint Utf8,
+    watermark Timestamp,
+    best_submissions Json,
+    updated_at Timestamp,
+    PRIMARY KEY (name)
+);
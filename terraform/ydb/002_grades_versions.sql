@@ -0,0 +1,9 @@
+-- Change stamps read by the grades function to build its ETag. Every writer
+-- upserts (name = <table it wrote>, changed_at = CurrentUtcTimestamp()) in the
+-- same query as its write: the webhook for github_events_log_v3,
+-- save_user_info for github_nick_to_fio, save_exam_grades for exam_grades.
+CREATE TABLE grades_versions (
+    name Utf8 NOT NULL,
+    changed_at Timestamp,
+    PRIMARY KEY (name)
+);
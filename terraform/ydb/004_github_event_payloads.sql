@@ -0,0 +1,19 @@
+-- Cold storage of raw webhook payloads, split off the events log: the log
+-- keeps only the narrow columns grading reads, the full JSON body lives here
+-- under the same (check_run_id, action) key for audits and re-parsing.
+-- The webhook writes both in one query (functions/github_actions_hook/index.py).
+--
+-- payload is gzip-compressed JSON (encoding = "gzip"). Rows expire a year
+-- after they were received.
+CREATE TABLE github_event_payloads (
+    check_run_id Uint64 NOT NULL,
+    action Utf8 NOT NULL,
+    delivery_id Utf8,
+    encoding Utf8,
+    payload String,
+    received_at Timestamp NOT NULL,
+    PRIMARY KEY (check_run_id, action)
+)
+WITH (
+    TTL = Interval("P365D") ON received_at
+);
@@ -0,0 +1,19 @@
+-- Best submission per (term, student, homework), maintained by the webhook:
+-- every counted check run is folded in with a conditional upsert that keeps
+-- the higher penalized score (ties go to the later submission), the same rule
+-- as grading.merge_best_submission. term is the UTC year the event arrived
+-- in, like the grades function's term bounds. The grades function reads it
+-- with aggregation=table. Penalties use hw-meta.json deadlines as of
+-- ingestion; after a deadline change, regenerate the term from the events log:
+--   python3 functions/grades/index.py rebuild-best-submissions [--year YYYY]
+CREATE TABLE best_submissions (
+    term Uint32 NOT NULL,
+    student_login Utf8 NOT NULL,
+    homework Utf8 NOT NULL,
+    max_points Int32,
+    penalty_days Int32,
+    result_points Double,
+    completed_at Timestamp,
+    updated_at Timestamp,
+    PRIMARY KEY (term, student_login, homework)
+);
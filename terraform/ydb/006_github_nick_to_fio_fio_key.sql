@@ -0,0 +1,10 @@
+-- Normalized FIO (grading.normalize_fio) of each student, the key exam_grades
+-- rows are matched by. The grades function's student page looks up a
+-- student's namesakes through idx_fio_key instead of scanning the table.
+-- save_user_info writes it with every FIO; for the rows already there, run
+-- once after this migration:
+--   python3 functions/grades/index.py fill-fio-keys
+ALTER TABLE github_nick_to_fio ADD COLUMN fio_key Utf8;
+
+ALTER TABLE github_nick_to_fio
+    ADD INDEX idx_fio_key GLOBAL SYNC ON (fio_key) COVER (fio);
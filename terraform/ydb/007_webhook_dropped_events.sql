@@ -0,0 +1,10 @@
+-- Events the webhook acknowledged without counting them for grading, per UTC
+-- day and homeworks.drop_reason. Each drop adds one in its own query, or in
+-- the query that logs an unknown_repo event (see drop_event and execute_query
+-- in functions/github_actions_hook/index.py).
+CREATE TABLE webhook_dropped_events (
+    day Date NOT NULL,
+    reason Utf8 NOT NULL,
+    dropped Uint64,
+    PRIMARY KEY (day, reason)
+);
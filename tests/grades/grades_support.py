@@ -0,0 +1,235 @@
+"""Shared data and helpers of the grades tests (terraform/functions/grades).
+
+No YDB: events are generated in memory and FakePool answers the grades
+function's queries from plain Python lists. hw-meta.json next to this file is a
+frozen copy, so summary_baseline.json doesn't change with the course.
+"""
+import contextlib
+import datetime
+import html.parser
+import random
+import sys
+import types
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+GRADES_DIR = HERE.parent.parent / "terraform" / "functions" / "grades"
+HOOK_DIR = HERE.parent.parent / "terraform" / "functions" / "github_actions_hook"
+sys.path.insert(0, str(GRADES_DIR))
+
+import grading  # noqa: E402
+import homeworks  # noqa: E402
+
+META_PATH = HERE / "hw-meta.json"
+
+# The term the synthetic events and hw-meta.json deadlines fall in.
+TERM_NOW = datetime.datetime(2026, 3, 1)
+
+STUDENTS = [f"stud{i}" for i in range(12)] + ["rakhamidullin", "Denisin", "sblenlkj"]
+FIOS = {
+    **{f"stud{i}": (f"Иванов {i}", "ЭАД" if i % 4 else "") for i in range(0, 12, 2)},
+    # Same FIO twice: the exam row goes to one of them only.
+    "stud3": ("Петров Пётр", "ФЭН"),
+    "stud5": ("петров петр", ""),
+    "Denisin": ("Денисов", "ФТиАД"),
+}
+EXAM_SUMS = {"иванов 2": 2.0, "иванов 4": 1.0, "петров петр": 1.5, "сидоров": 2.0}
+FORCED_FINAL_GRADES = {"Denisin": 4.0}
+BONUSES = [{"sender": "sblenlkj", "homework": "hw-rnn-attention", "bonus_points": 50}]
+
+
+class Row:
+    def __init__(self, sender, repo_name, completed_at_str, check_run_summary, event_time):
+        self.sender = sender
+        self.repo_name = repo_name
+        self.completed_at_str = completed_at_str
+        self.check_run_summary = check_run_summary
+        self.event_time = event_time
+        # Filled in by parsed() as the webhook does; None on older rows.
+        self.homework = self.student_login = self.points = self.max_points = self.completed_at = None
+
+
+def synthetic_rows(known_homeworks, seed=0):
+    """Late and early attempts, bot senders, unknown repos, re-accepted repos, empty summaries."""
+    rnd = random.Random(seed)
+    rows = []
+    for hw_id, meta in known_homeworks.items():
+        max_points = meta["max_points"] or 100
+        for s, login in enumerate(STUDENTS):
+            for attempt in range(rnd.randint(0, 3)):
+                completed_at = meta["deadline"] + datetime.timedelta(hours=rnd.randint(-240, 120), seconds=rnd.randint(0, 3599))
+                repo_name = f"fintech-dl-hse-{hw_id}-{login}" + ("-2" if s % 5 == 4 else "")
+                summary = f"Points {rnd.randint(0, max_points)}/{max_points}"
+                roll = rnd.random()
+                if roll < 0.05:
+                    sender = "github-classroom[bot]"
+                elif roll < 0.1:
+                    repo_name = f"fintech-dl-hse-sandbox-{login}"
+                    sender = login
+                elif roll < 0.13:
+                    summary = ""
+                    sender = login
+                else:
+                    sender = login
+                rows.append(Row(
+                    sender,
+                    repo_name,
+                    completed_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    summary,
+                    datetime.datetime(completed_at.year, completed_at.month, completed_at.day),
+                ))
+    return rows
+
+
+def parsed(rows, homework_index):
+    for row in rows:
+        if row.check_run_summary:
+            for name, value in homeworks.parse_check_run(
+                    homework_index, row.repo_name, row.check_run_summary, row.completed_at_str).items():
+                setattr(row, name, value)
+    return rows
+
+
+def summary_page(rows, known_homeworks, homework_index):
+    best_submissions = grading.SubmissionTable()
+    for submission in grading.parse_events(rows, known_homeworks, homework_index, homeworks.FORCED_PENALTY_DAYS):
+        grading.merge_best_submission(best_submissions, submission)
+    hw_to_max_points = {s["homework"]: s["max_points"] for s in best_submissions.values()}
+    result_rows = grading.apply_bonuses(best_submissions, BONUSES, known_homeworks)
+    senders = {row["sender"] for row in result_rows}
+    summary = grading.build_summary(
+        result_rows,
+        {nick: fio for nick, (fio, _) in FIOS.items() if nick in senders},
+        {nick: dept for nick, (_, dept) in FIOS.items() if nick in senders},
+        EXAM_SUMS,
+        known_homeworks,
+        FORCED_FINAL_GRADES,
+    )
+    return grading.render_summary_page(summary, result_rows, known_homeworks, hw_to_max_points)
+
+
+class _Tables(html.parser.HTMLParser):
+    """Cell texts of every <table>; input values count as text."""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self.tables[-1].append([])
+        elif tag in ("td", "th") and self.tables:
+            self._cell = []
+        elif tag == "input" and self._cell is not None and dict(attrs).get("value"):
+            self._cell.append(dict(attrs)["value"])
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self.tables[-1][-1].append(" ".join("".join(self._cell).split()))
+            self._cell = None
+
+
+def page_tables(page):
+    """Students table without the department column (its <select> markup changed), and homework stats."""
+    parser = _Tables()
+    parser.feed(page)
+    students, stats = parser.tables[0], parser.tables[1]
+    department = students[0].index("department")
+    return {
+        "students": [row[:department] + row[department + 1:] for row in students],
+        "homework_stats": stats,
+    }
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+class FakePool:
+    """In-memory stand-in for ydb_pool.LazyPool, keyed on the query text.
+
+    Serves the events log (events), github_nick_to_fio (fios: nick -> (fio,
+    department)), exam_grades (exam: normalized fio -> sum), grades_versions
+    and grades_snapshot. Every query and its parameters land in `queries`.
+    Event reads come back in result set parts of `part_rows` rows, like a
+    streamed scan.
+    """
+
+    def __init__(self, events=(), fios=None, exam=None, part_rows=100):
+        self.events = list(events)
+        self.fios = dict(fios or {})
+        self.exam = dict(exam or {})
+        self.versions = {"github_events_log_v3": datetime.datetime(2026, 3, 1)}
+        self.snapshots = {}
+        self.part_rows = part_rows
+        self.queries = []
+
+    def execute_with_retries(self, query, parameters=None):
+        self.queries.append((query, parameters or {}))
+        return self._answer(" ".join(query.split()), parameters or {})
+
+    def retry_operation_sync(self, callee):
+        return callee(self)
+
+    def execute(self, query, parameters=None):
+        return contextlib.nullcontext(self.execute_with_retries(query, parameters))
+
+    def event_queries(self):
+        return [params for query, params in self.queries if "FROM github_events_log_v3" in query]
+
+    def _answer(self, q, params):
+        value = {name: v[0] if isinstance(v, tuple) else v for name, v in params.items()}
+        if "FROM grades_versions" in q:
+            return [_result([types.SimpleNamespace(name=n, changed_at=t) for n, t in sorted(self.versions.items())])]
+        if "UPSERT INTO grades_snapshot" in q:
+            self.snapshots[value["$name"]] = types.SimpleNamespace(
+                fingerprint=value["$fingerprint"], watermark=value["$watermark"],
+                best_submissions=value["$best_submissions"])
+            return [_result([])]
+        if "FROM grades_snapshot" in q:
+            snapshot = self.snapshots.get(value["$name"])
+            return [_result([snapshot] if snapshot else [])]
+        if "FROM github_events_log_v3 VIEW idx_event_time" in q:
+            rows = [
+                row for row in self.events
+                if value["$since"] <= _as_date(row.event_time) < value["$until"] and row.check_run_summary
+            ]
+            return [_result(rows[i:i + self.part_rows]) for i in range(0, len(rows), self.part_rows)] or [_result([])]
+        if "FROM github_events_log_v3 VIEW idx_student_login" in q:
+            return [_result([
+                row for row in self.events
+                if row.student_login in value["$student_logins"]
+                and value["$since"] <= _as_date(row.event_time) < value["$until"] and row.check_run_summary
+            ])]
+        if "FROM github_nick_to_fio VIEW idx_fio_key" in q:
+            return [_result([
+                types.SimpleNamespace(github_nick=nick, fio=fio)
+                for nick, (fio, _) in sorted(self.fios.items())
+                if grading.normalize_fio(fio) == value["$fio_key"] and nick < value["$github_nick"]
+            ])]
+        if "FROM github_nick_to_fio WHERE github_nick IN" in q:
+            return [_result([
+                types.SimpleNamespace(github_nick=nick, fio=fio, department=department)
+                for nick, (fio, department) in self.fios.items() if nick in value["$github_nicks"]
+            ])]
+        if "SELECT exam_sum FROM exam_grades WHERE fio = $fio" in q:
+            fio = value["$fio"]
+            return [_result([types.SimpleNamespace(exam_sum=self.exam[fio])] if fio in self.exam else [])]
+        if q.startswith("SELECT fio, exam_sum FROM exam_grades"):
+            return [_result([types.SimpleNamespace(fio=fio, exam_sum=s) for fio, s in self.exam.items()])]
+        return [_result([])]
+
+
+def _result(rows):
+    return types.SimpleNamespace(rows=rows)
+
+
+def page_event(**query):
+    return {"queryStringParameters": query, "headers": {}}
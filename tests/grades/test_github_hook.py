@@ -0,0 +1,138 @@
+"""The GitHub webhook (terraform/functions/github_actions_hook/index.py) against FakePool."""
+import datetime
+import gzip
+import hashlib
+import hmac
+import importlib.util
+import json
+
+import pytest
+
+from grades_support import HOOK_DIR, FakePool, homeworks
+
+SECRET = "webhook-secret"
+
+
+@pytest.fixture
+def hook(monkeypatch):
+    pytest.importorskip("ydb")
+    # Both functions name their module index; the webhook gets its own name.
+    spec = importlib.util.spec_from_file_location("github_actions_hook", HOOK_DIR / "index.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "hithub_webhook_secret_token", SECRET)
+    monkeypatch.setattr(module, "pool", FakePool())
+    return module
+
+
+def check_run_event(action="completed", repo=None, sender="alice", summary="Points 7/10",
+                    completed_at="2026-03-01T12:00:00Z", check_run_id=42, headers=None):
+    homework = next(iter(homeworks.load_known_homeworks()))
+    body = json.dumps({
+        "action": action,
+        "check_run": {"id": check_run_id, "completed_at": completed_at, "output": {"summary": summary}},
+        "repository": {"name": repo or f"fintech-dl-hse-{homework}-{sender}"},
+        "sender": {"login": sender},
+    })
+    signature = "sha256=" + hmac.new(SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+    return {"body": body, "headers": {"X-Hub-Signature-256": signature, **(headers or {})}}
+
+
+def test_bad_signature_is_rejected(hook):
+    event = check_run_event()
+    event["headers"]["X-Hub-Signature-256"] = "sha256=0"
+    assert hook.handler(event, None)["statusCode"] == 404
+    assert hook.pool.queries == []
+
+
+@pytest.mark.parametrize("action", ["created", "rerequested"])
+def test_check_runs_that_havent_completed_are_dropped(hook, action):
+    response = hook.handler(check_run_event(action=action), None)
+    assert response == {"statusCode": 200, "body": "ignored: not_completed"}
+    assert hook.pool.queries == [(hook.COUNT_DROPPED_EVENT, {"$reason": "not_completed"})]
+
+
+def test_events_without_a_check_run_are_dropped(hook):
+    body = json.dumps({"zen": "Keep it logically awesome.", "hook_id": 1})
+    signature = "sha256=" + hmac.new(SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+    response = hook.handler({"body": body, "headers": {"x-hub-signature-256": signature}}, None)
+    assert response["body"] == "ignored: not_check_run"
+    assert hook.pool.queries == [(hook.COUNT_DROPPED_EVENT, {"$reason": "not_check_run"})]
+
+
+def test_completed_check_run_is_upserted_by_its_key(hook):
+    # The gateway canonicalizes header names: X-GitHub-Delivery arrives as X-Github-Delivery.
+    event = check_run_event(check_run_id=2 ** 40, headers={"X-Github-Delivery": "delivery-1"})
+    assert hook.handler(event, None)["statusCode"] == 200
+    (query, params), = hook.pool.queries
+    assert "UPSERT INTO github_events_log_v3" in query
+    assert params["$check_run_id"][0] == 2 ** 40
+    assert params["$action"] == "completed"
+    assert params["$delivery_id"][0] == "delivery-1"
+    assert gzip.decompress(params["$payload"][0]).decode() == event["body"]
+    assert params["$student_login"][0] == "alice"
+    assert params["$points"][0] == 7
+
+
+@pytest.mark.parametrize("event, reason", [
+    (dict(sender="github-classroom[bot]"), "bot_sender"),
+    (dict(summary="Tests failed"), "no_points"),
+    (dict(completed_at=None), "no_completed_at"),
+])
+def test_events_that_dont_count_are_only_counted(hook, event, reason):
+    response = hook.handler(check_run_event(**event), None)
+    assert response["body"] == f"ignored: {reason}"
+    assert hook.pool.queries == [(hook.COUNT_DROPPED_EVENT, {"$reason": reason})]
+
+
+def test_drop_count_failure_still_acknowledges(hook, monkeypatch):
+    def fail(query, parameters=None):
+        raise RuntimeError("ydb is down")
+
+    monkeypatch.setattr(hook.pool, "execute_with_retries", fail)
+    assert hook.handler(check_run_event(action="created"), None) == {"statusCode": 200, "body": "ignored: not_completed"}
+
+
+def test_unknown_repo_is_logged_without_typed_columns(hook):
+    event = check_run_event(repo="fintech-dl-hse-hw-not-in-meta-alice")
+    assert hook.handler(event, None)["body"] == "ignored: unknown_repo"
+    (query, params), = hook.pool.queries
+    assert query == hook.LOG_UNKNOWN_REPO_EVENT_QUERY
+    assert "best_submissions" not in query
+    assert params["$reason"] == "unknown_repo"
+    assert params["$repo"] == "fintech-dl-hse-hw-not-in-meta-alice"
+    assert params["$homework"][0] is None and params["$student_login"][0] is None
+    assert params["$points"][0] == 7
+
+
+
+def _deadline_and_homework():
+    homework, meta = next(iter(homeworks.load_known_homeworks().items()))
+    return meta["deadline"], homework
+
+
+@pytest.mark.parametrize("late, penalty_days, result_points", [
+    (datetime.timedelta(hours=-1), 0, 7.0),
+    (datetime.timedelta(hours=30), 2, 5.6),
+    (datetime.timedelta(days=60), homeworks.MAX_PENALTY_DAYS, 7 * (100 - homeworks.MAX_PENALTY_DAYS * 10) / 100),
+])
+def test_counted_event_is_folded_into_best_submissions(hook, late, penalty_days, result_points):
+    deadline, homework = _deadline_and_homework()
+    completed_at = (deadline + late).strftime("%Y-%m-%dT%H:%M:%SZ")
+    assert hook.handler(check_run_event(completed_at=completed_at), None)["statusCode"] == 200
+    (query, params), = hook.pool.queries
+    assert query == hook.LOG_EVENT_QUERY
+    assert params["$term"] == (datetime.datetime.now(datetime.timezone.utc).year, hook.ydb.PrimitiveType.Uint32)
+    assert params["$homework"][0] == homework
+    assert params["$penalty_days"][0] == penalty_days
+    assert params["$result_points"][0] == pytest.approx(result_points)
+
+
+def test_forced_penalty_days_override_the_deadline(hook, monkeypatch):
+    deadline, homework = _deadline_and_homework()
+    monkeypatch.setitem(homeworks.FORCED_PENALTY_DAYS, f"{homework}-alice", 0)
+    completed_at = (deadline + datetime.timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    hook.handler(check_run_event(completed_at=completed_at), None)
+    (_, params), = hook.pool.queries
+    assert params["$penalty_days"][0] == 0
+    assert params["$result_points"][0] == 7.0
@@ -0,0 +1,322 @@
+"""The grades function (terraform/functions/grades/index.py): HTTP handlers and maintenance commands against FakePool."""
+import base64
+import datetime
+import gzip
+import json
+import types
+
+import pytest
+
+from grades_support import EXAM_SUMS, FIOS, TERM_NOW, FakePool, homeworks, page_event, parsed, synthetic_rows
+
+import index as grades_index
+
+
+@pytest.fixture
+def index(monkeypatch):
+    term_bounds = grades_index._term_bounds
+    monkeypatch.setattr(grades_index, "_term_bounds", lambda now=None: term_bounds(now or TERM_NOW))
+    grades_index._snapshot_cache.clear()
+    yield grades_index
+    grades_index._snapshot_cache.clear()
+
+
+def _use_pool(index, monkeypatch, pool):
+    monkeypatch.setattr(index, "pool", pool)
+    return pool
+
+
+def snapshot_name(index):
+    return f"best_submissions_{index._term_bounds()[0].year}"
+
+
+def test_snapshot_reads_only_from_the_watermark(index, monkeypatch):
+    rows = synthetic_rows(homeworks.load_known_homeworks())
+    cut = sorted(row.event_time for row in rows)[len(rows) // 2]
+    old = [row for row in rows if row.event_time < cut]
+    pool = _use_pool(index, monkeypatch, FakePool(old))
+
+    index.handler_detailed(page_event(format="json"), None)
+    snapshot, = pool.snapshots.values()
+    watermark = max(row.event_time for row in old)
+    assert snapshot.watermark == watermark
+
+    # A cold instance: the snapshot comes from the table, the events after it
+    # from the log.
+    index._snapshot_cache.clear()
+    pool.events = rows
+    pool.queries.clear()
+    incremental = index.handler_detailed(page_event(format="json"), None)
+    since = [params["$since"][0] for params in pool.event_queries()]
+    assert since == [watermark.date()]
+    assert pool.snapshots[snapshot_name(index)].watermark == max(row.event_time for row in rows)
+
+    _use_pool(index, monkeypatch, FakePool(rows))
+    rebuilt = index.handler_detailed(page_event(format="json", snapshot="rebuild"), None)
+    assert json.loads(incremental["body"]) == json.loads(rebuilt["body"])
+
+
+def test_snapshot_of_another_hw_meta_is_not_used(index, monkeypatch):
+    rows = synthetic_rows(homeworks.load_known_homeworks())
+    pool = _use_pool(index, monkeypatch, FakePool(rows))
+    index.handler_detailed(page_event(format="json"), None)
+
+    index._snapshot_cache.clear()
+    monkeypatch.setattr(index, "_hw_meta_hash", lambda: "changed")
+    pool.queries.clear()
+    index.handler_detailed(page_event(format="json"), None)
+    since = [params["$since"][0] for params in pool.event_queries()]
+    assert since == [TERM_NOW.replace(month=1, day=1).date()]
+
+
+def test_unchanged_page_is_a_304_without_reading_events(index, monkeypatch):
+    pool = _use_pool(index, monkeypatch, FakePool(synthetic_rows(homeworks.load_known_homeworks())))
+    first = index.handler_summary(page_event(), None)
+    assert first["statusCode"] == 200
+    etag = first["headers"]["ETag"]
+    assert first["headers"]["Cache-Control"] == index.GRADES_CACHE_CONTROL
+
+    pool.queries.clear()
+    event = page_event()
+    event["headers"] = {"if-none-match": f'"other", {etag}'}
+    second = index.handler_summary(event, None)
+    assert second["statusCode"] == 304
+    assert second["body"] == ""
+    assert [query for query, _ in pool.queries] == ["SELECT name, changed_at FROM grades_versions"]
+
+    # A writer stamping grades_versions is a new version of the page.
+    pool.versions["exam_grades"] = TERM_NOW
+    third = index.handler_summary(event, None)
+    assert third["statusCode"] == 200
+    assert third["headers"]["ETag"] != etag
+
+
+def test_views_have_their_own_etags(index, monkeypatch):
+    _use_pool(index, monkeypatch, FakePool())
+    etags = {
+        index.handler_summary(page_event(), None)["headers"]["ETag"],
+        index.handler_summary(page_event(format="json"), None)["headers"]["ETag"],
+        index.handler_detailed(page_event(), None)["headers"]["ETag"],
+    }
+    assert len(etags) == 3
+
+
+def _body(response):
+    raw = base64.b64decode(response["body"]) if response.get("isBase64Encoded") else response["body"].encode()
+    encoding = response["headers"].get("Content-Encoding")
+    if encoding == "gzip":
+        return gzip.decompress(raw).decode()
+    if encoding == "br":
+        return pytest.importorskip("brotli").decompress(raw).decode()
+    return raw.decode()
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip;q=0.5", "gzip"),
+    ("*", "gzip"),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_pages_are_compressed_per_accept_encoding(index, monkeypatch, accept_encoding, encoding):
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    _use_pool(index, monkeypatch, FakePool(synthetic_rows(homeworks.load_known_homeworks())))
+    plain = index.handler_summary(page_event(), None)
+    assert "Content-Encoding" not in plain["headers"]
+
+    event = page_event()
+    event["headers"] = {"Accept-Encoding": accept_encoding}
+    response = index.handler_summary(event, None)
+    assert response["headers"].get("Content-Encoding") == encoding
+    assert response.get("isBase64Encoded", False) == (encoding is not None)
+    assert response["headers"]["Vary"] == "Accept-Encoding"
+    assert _body(response) == plain["body"]
+
+
+def test_br_falls_back_to_gzip_without_brotli(index, monkeypatch):
+    monkeypatch.setattr(index, "_load_brotli", lambda: False)
+    response = index._compress_response(
+        {"headers": {"accept-encoding": "br, gzip"}}, {"statusCode": 200, "body": "x" * index.COMPRESS_MIN_BYTES})
+    assert response["headers"]["Content-Encoding"] == "gzip"
+
+
+def test_small_and_non_200_bodies_are_sent_as_is(index):
+    small = index._compress_response(
+        {"headers": {"Accept-Encoding": "gzip"}}, {"statusCode": 200, "body": "x" * (index.COMPRESS_MIN_BYTES - 1)})
+    error = index._compress_response(
+        {"headers": {"Accept-Encoding": "gzip"}}, {"statusCode": 500, "body": "x" * index.COMPRESS_MIN_BYTES})
+    for response in (small, error):
+        assert "Content-Encoding" not in response["headers"]
+        assert response["headers"]["Vary"] == "Accept-Encoding"
+
+
+def test_app_page_revalidates_across_encodings(index):
+    gzipped = index._app_page_response({"headers": {"Accept-Encoding": "gzip"}})
+    assert gzipped["headers"]["Content-Encoding"] == "gzip"
+    etag = gzipped["headers"]["ETag"]
+    assert etag.startswith('W/"')
+
+    revalidated = index._app_page_response({"headers": {"if-none-match": etag}})
+    assert revalidated["statusCode"] == 304
+    assert revalidated["headers"]["Vary"] == "Accept-Encoding"
+
+
+def _post(body, **query):
+    return {"queryStringParameters": query, "headers": {}, "body": json.dumps(body)}
+
+
+def test_exam_upload_replaces_the_table_in_one_query(index, monkeypatch):
+    monkeypatch.setenv("EXAM_GRADES_SECRET_TOKEN", "secret")
+    pool = _use_pool(index, monkeypatch, FakePool())
+    response = index.save_exam_grades(_post({"rows": [
+        {"fio": "Иванов  Иван", "exam_sum": "1.5"},
+        {"fio": "иванов иван", "exam_sum": 2},
+        {"fio": "", "exam_sum": 1},
+        {"fio": "Петров", "exam_sum": "n/a"},
+        "not a row",
+    ]}, token="secret"), None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"written": 1}
+    (query, params), = pool.queries
+    assert query == index.REPLACE_EXAM_GRADES_QUERY
+    assert params["$rows"][0] == [{"fio": "иванов иван", "exam_sum": 2.0}]
+
+
+@pytest.mark.parametrize("body", [[{"fio": "Иванов", "exam_sum": 1}], "rows", 1, {"rows": {}}])
+def test_exam_upload_rejects_bodies_without_a_rows_list(index, monkeypatch, body):
+    monkeypatch.setenv("EXAM_GRADES_SECRET_TOKEN", "secret")
+    pool = _use_pool(index, monkeypatch, FakePool())
+    assert index.save_exam_grades(_post(body, token="secret"), None)["statusCode"] == 400
+    assert index.save_exam_grades(_post({"rows": []}, token="wrong"), None)["statusCode"] == 401
+    assert pool.queries == []
+
+
+def test_user_info_batch_is_merged_in_one_query(index, monkeypatch):
+    pool = _use_pool(index, monkeypatch, FakePool())
+    response = index.save_user_info_batch(_post({"updates": [
+        {"github_nick": "stud1", "fio": "Иванов Иван"},
+        {"github_nick": "stud2", "department": "-"},
+        {"github_nick": "stud1", "department": "ЭАД"},
+    ]}), None)
+    assert response["statusCode"] == 200
+    (query, params), = pool.queries
+    assert query == index.MERGE_USERS_INFO_QUERY
+    assert params["$updates"][0] == [
+        {"github_nick": "stud1", "fio": "Иванов Иван", "department": "ЭАД", "exam_fio": "иванов иван"},
+        {"github_nick": "stud2", "fio": None, "department": "", "exam_fio": None},
+    ]
+
+
+def test_invalid_user_info_batch_writes_nothing(index, monkeypatch):
+    pool = _use_pool(index, monkeypatch, FakePool())
+    response = index.save_user_info_batch(_post({"updates": [
+        {"github_nick": "stud1", "fio": "Иванов Иван"},
+        {"github_nick": "stud2", "department": ["ЭАД"]},
+        {"github_nick": "stud3", "department": "Мехмат"},
+        {"fio": "Без ника"},
+        {"github_nick": "stud4"},
+        {"github_nick": "stud5", "fio": 5},
+        "stud6",
+    ]}), None)
+    assert response["statusCode"] == 400
+    assert [error["index"] for error in json.loads(response["body"])["errors"]] == [1, 2, 3, 4, 5, 6]
+    assert pool.queries == []
+
+
+@pytest.mark.parametrize("body", [[], {"updates": {}}, {"updates": [{}] * 1001}])
+def test_user_info_batch_needs_an_updates_list(index, monkeypatch, body):
+    pool = _use_pool(index, monkeypatch, FakePool())
+    assert index.save_user_info_batch(_post(body), None)["statusCode"] == 400
+    assert pool.queries == []
+
+
+def test_student_page_matches_the_summary(index, monkeypatch):
+    known_homeworks = homeworks.load_known_homeworks()
+    rows = parsed(synthetic_rows(known_homeworks), homeworks.HomeworkIndex(known_homeworks.keys()))
+    fios = {**FIOS, "late": ("Сидоров", ""), "aaa": ("сидоров", "")}
+    pool = _use_pool(index, monkeypatch, FakePool(rows, fios, EXAM_SUMS))
+    columns = json.loads(index.handler_summary(page_event(format="json"), None)["body"])["students"]
+    summary = {sender: {name: values[i] for name, values in columns.items()} for i, sender in enumerate(columns["sender"])}
+
+    pool.queries.clear()
+    for nick in summary:
+        student = json.loads(index.handler_student(page_event(github_nick=nick), None)["body"])
+        for name in ("result_points", "hw_hse_grade", "exam_hse_grade", "final_hse_grade"):
+            assert str(student[name]) == str(summary[nick][name]), (nick, name)
+    # Namesakes without submissions: none takes the exam row from the other,
+    # and the exam alone counts.
+    for nick in ("aaa", "late"):
+        student = json.loads(index.handler_student(page_event(github_nick=nick), None)["body"])
+        assert student["exam_hse_grade"] == f"{index.grading.exam_grade(EXAM_SUMS['сидоров']):.2f}"
+    assert not any("FROM github_nick_to_fio" in query and "WHERE" not in query for query, _ in pool.queries)
+
+
+class _V2Pool(FakePool):
+    def __init__(self, v2_rows):
+        super().__init__()
+        self.v2_rows = v2_rows
+
+    def _answer(self, q, params):
+        if "FROM github_events_log_v2" in q:
+            return [types.SimpleNamespace(rows=self.v2_rows[i:i + 3]) for i in range(0, len(self.v2_rows), 3)]
+        return super()._answer(q, params)
+
+
+def _v2_row(action, check_run_id, repo_name="fintech-dl-hse-hw-mlp-alice", summary="Points 7/10"):
+    event_data = json.dumps({"action": action, "check_run": {"id": check_run_id}})
+    return types.SimpleNamespace(
+        event_time=datetime.datetime(2026, 2, 1), sender="alice", repo_name=repo_name,
+        check_run_summary=summary, completed_at_str="2026-02-01T10:00:00Z", event_data=event_data)
+
+
+def test_events_log_backfill_is_batched(index, monkeypatch):
+    monkeypatch.setattr(index, "BACKFILL_BATCH_ROWS", 2)
+    monkeypatch.setattr(index.homeworks, "load_homework_index", lambda: homeworks.HomeworkIndex(["hw-mlp"]))
+    v2_rows = [
+        _v2_row("created", 1),
+        _v2_row("completed", 1),
+        _v2_row("completed", 1),  # a redelivery
+        _v2_row("completed", 2, repo_name="fintech-dl-hse-sandbox-alice"),
+        types.SimpleNamespace(**{**vars(_v2_row("completed", 3)), "event_data": "not json"}),
+        _v2_row("completed", 4),
+        _v2_row("completed", 5),
+    ]
+    pool = _use_pool(index, monkeypatch, _V2Pool(v2_rows))
+    assert index.backfill_events_log() == 4
+
+    batches = [params["$events"][0] for query, params in pool.queries if query == index.BACKFILL_EVENTS_QUERY]
+    assert [[event["check_run_id"] for event in batch] for batch in batches] == [[1, 2], [4, 5]]
+    first = batches[0][0]
+    assert (first["homework"], first["student_login"], first["points"]) == ("hw-mlp", "alice", 7)
+    assert first["event_time"] == datetime.date(2026, 2, 1)
+    assert json.loads(gzip.decompress(first["payload"])) == {"action": "completed", "check_run": {"id": 1}}
+    assert batches[0][1]["homework"] is None
+
+
+def test_reparse_fills_in_events_of_homeworks_added_later(index, monkeypatch):
+    monkeypatch.setattr(index.homeworks, "load_homework_index", lambda: homeworks.HomeworkIndex(["hw-mlp", "hw-new"]))
+    unparsed = [
+        types.SimpleNamespace(check_run_id=1, action="completed", repo_name="fintech-dl-hse-hw-new-alice-2",
+                              check_run_summary="Points 3/4", completed_at_str="2026-02-01T10:00:00Z"),
+        types.SimpleNamespace(check_run_id=2, action="completed", repo_name="fintech-dl-hse-sandbox-alice",
+                              check_run_summary="Points 3/4", completed_at_str="2026-02-01T10:00:00Z"),
+    ]
+
+    class _UnparsedPool(FakePool):
+        def _answer(self, q, params):
+            if "homework IS NULL" in q:
+                return [types.SimpleNamespace(rows=unparsed)]
+            return super()._answer(q, params)
+
+    pool = _use_pool(index, monkeypatch, _UnparsedPool())
+    assert index.reparse_events(2026) == 1
+    (query, params), = [(query, params) for query, params in pool.queries if query == index.REPARSED_EVENTS_QUERY]
+    assert params["$rows"][0] == [{
+        "check_run_id": 1, "action": "completed", "homework": "hw-new", "student_login": "alice",
+        "points": 3, "max_points": 4, "completed_at": datetime.datetime(2026, 2, 1, 10),
+    }]
+    since, = [params["$since"][0] for query, params in pool.queries if "homework IS NULL" in query]
+    assert since == datetime.date(2026, 1, 1)
+
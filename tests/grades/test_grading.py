@@ -0,0 +1,79 @@
+"""grading.py: parsing, best-submission merge, summary and rendering.
+
+summary_baseline.json holds the summary page tables the pandas implementation
+the function started from rendered for the same events.
+"""
+import datetime
+import json
+import random
+
+import pytest
+
+from grades_support import HERE, META_PATH, grading, homeworks, page_tables, parsed, summary_page, synthetic_rows
+
+
+@pytest.fixture(scope="module")
+def known_homeworks():
+    return homeworks.load_known_homeworks(META_PATH)
+
+
+@pytest.fixture(scope="module")
+def homework_index(known_homeworks):
+    return homeworks.HomeworkIndex(known_homeworks.keys())
+
+
+def test_summary_page_matches_baseline(known_homeworks, homework_index):
+    expected = json.loads((HERE / "summary_baseline.json").read_text(encoding="utf-8"))
+    page = summary_page(synthetic_rows(known_homeworks), known_homeworks, homework_index)
+    assert page_tables(page) == expected
+
+
+def test_parsed_columns_give_the_same_page(known_homeworks, homework_index):
+    raw = summary_page(synthetic_rows(known_homeworks), known_homeworks, homework_index)
+    rows = parsed(synthetic_rows(known_homeworks), homework_index)
+    assert raw == summary_page(rows, known_homeworks, homework_index)
+
+
+def _submission(sender, homework, result_points, completed_at, penalty_days=0.0, max_points=100):
+    return {
+        "sender": sender,
+        "max_points": max_points,
+        "result_points": result_points,
+        "homework": homework,
+        "penalty_days": penalty_days,
+        "penalty_percent": penalty_days * 10,
+        "completed_at": completed_at,
+    }
+
+
+def test_submission_table_matches_dict_merge():
+    rnd = random.Random(1)
+    start = datetime.datetime(2026, 2, 1)
+    submissions = [
+        _submission(
+            f"s{rnd.randint(0, 20)}", f"hw-{rnd.randint(0, 5)}",
+            rnd.choice([0.0, 50.0, 70.0, 100.0, 35.5]),
+            start + datetime.timedelta(seconds=rnd.randint(0, 10 ** 6)),
+            float(rnd.randint(0, 3)),
+        )
+        for _ in range(2000)
+    ]
+    table, expected = grading.SubmissionTable(), {}
+    for submission in submissions:
+        assert grading.merge_best_submission(table, submission) == grading.merge_best_submission(expected, submission)
+    assert len(table) == len(expected)
+    assert dict(table.items()) == expected
+    assert table.get(("nobody", "hw-0")) is None
+    assert ("nobody", "hw-0") not in table
+
+
+def test_submission_table_copy_is_independent():
+    start = datetime.datetime(2026, 2, 1)
+    table = grading.SubmissionTable([_submission("alice", "hw-mlp", 50.0, start)])
+    copy = table.copy()
+    grading.merge_best_submission(copy, _submission("alice", "hw-mlp", 90.0, start))
+    grading.merge_best_submission(copy, _submission("bob", "hw-mlp", 10.0, start))
+    assert table[("alice", "hw-mlp")]["result_points"] == 50.0
+    assert len(table) == 1
+    assert copy[("alice", "hw-mlp")]["result_points"] == 90.0
+    assert len(copy) == 2
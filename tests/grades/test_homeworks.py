@@ -0,0 +1,72 @@
+"""homeworks.py: repo name resolution and check_run parsing shared by the grades function and the webhook."""
+import datetime
+
+from grades_support import homeworks
+
+
+def test_resolve():
+    index = homeworks.HomeworkIndex(["hw-mlp", "hw-mlp-advanced", "hw-rnn"])
+    assert index.resolve("fintech-dl-hse-hw-mlp-alice") == ("hw-mlp", "alice")
+    assert index.resolve("hw-mlp-alice") == ("hw-mlp", "alice")
+    assert index.resolve("fintech-dl-hse-hw-mlp-advanced-bob") == ("hw-mlp-advanced", "bob")
+    assert index.resolve("fintech-dl-hse-hw-mlp-bob-12") == ("hw-mlp", "bob")
+    assert index.resolve("fintech-dl-hse-hw-mlp-a-b-c") == ("hw-mlp", "a-b-c")
+    assert index.resolve("fintech-dl-hse-hw-mlp-") is None
+    assert index.resolve("fintech-dl-hse-hw-mlp-3") == ("hw-mlp", "3")
+    assert index.resolve("fintech-dl-hse-hw-mlp") is None
+    assert index.resolve("fintech-dl-hse-sandbox-alice") is None
+
+
+def test_resolve_takes_the_longest_homework_id():
+    index = homeworks.HomeworkIndex(["hw-a", "hw-a-b", "hw-a-b-c"])
+    assert index.resolve("fintech-dl-hse-hw-a-b-c-d") == ("hw-a-b-c", "d")
+    assert index.resolve("fintech-dl-hse-hw-a-b-x") == ("hw-a-b", "x")
+    assert index.resolve("fintech-dl-hse-hw-a-bx") == ("hw-a", "bx")
+
+
+def test_every_attempt_repo_parses_to_the_student_login():
+    # The student page reads a student's rows by this column.
+    index = homeworks.HomeworkIndex(["hw-mlp", "hw-mlp-advanced"])
+    logins = {
+        name: homeworks.parse_check_run(index, name, "Points 1/2", "2026-03-01T12:00:00Z")["student_login"]
+        for name in [
+            "fintech-dl-hse-hw-mlp-alice",
+            "fintech-dl-hse-hw-mlp-alice-1",
+            "fintech-dl-hse-hw-mlp-alice-17",
+            "fintech-dl-hse-hw-mlp-advanced-alice-2",
+            "fintech-dl-hse-hw-mlp-alice-bob",
+            "fintech-dl-hse-sandbox-alice",
+        ]
+    }
+    assert [name for name, login in logins.items() if login == "alice"] == list(logins)[:4]
+    assert logins["fintech-dl-hse-hw-mlp-alice-bob"] == "alice-bob"
+    assert logins["fintech-dl-hse-sandbox-alice"] is None
+
+
+def test_parse_check_run():
+    index = homeworks.HomeworkIndex(["hw-mlp"])
+    assert homeworks.parse_check_run(
+        index, "fintech-dl-hse-hw-mlp-alice-2", "Points 7/10", "2026-03-01T12:30:00Z") == {
+        "homework": "hw-mlp",
+        "student_login": "alice",
+        "points": 7,
+        "max_points": 10,
+        "completed_at": datetime.datetime(2026, 3, 1, 12, 30),
+    }
+    assert homeworks.parse_check_run(index, "fintech-dl-hse-sandbox-alice", "Tests failed", None) == dict.fromkeys(
+        ["homework", "student_login", "points", "max_points", "completed_at"])
+
+
+def test_drop_reason():
+    index = homeworks.HomeworkIndex(["hw-mlp"])
+
+    def reason(sender="alice", repo="fintech-dl-hse-hw-mlp-alice", summary="Points 1/2", completed_at="2026-03-01T12:00:00Z"):
+        return homeworks.drop_reason(sender, homeworks.parse_check_run(index, repo, summary, completed_at))
+
+    assert reason() is None
+    assert reason(sender="github-classroom[bot]") == "bot_sender"
+    assert reason(sender=None) == "bot_sender"
+    assert reason(repo="fintech-dl-hse-sandbox-alice") == "unknown_repo"
+    assert reason(summary="") == "no_points"
+    assert reason(completed_at=None) == "no_completed_at"
+